@@ -1,23 +1,69 @@
-from functools import partial
-from markdownify import markdownify
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from markdownify import MarkdownConverter, markdownify
 from markdown import markdown
 
 from reader.reference import set_reference_obj, construct_related_figures
 from mllm import Chat
+from mllm.utils import parallel_map
 
 import re
 from typing import List
 
-import requests
 from bs4 import BeautifulSoup
 from bs4 import Tag
 
-from tree.helper import node_map_with_dependency
+from tree.helper import anode_map_with_dependency, run_coroutine
+from tree.session import REQUEST_TIMEOUT, make_session
 
 from tree import Node
 from reader.summary import Summary
 
 high_quality_arxiv_summary = False
+# Print the parsing progress and the LLM results
+verbose = False
+
+_SESSION = make_session(pool_maxsize=20, retries=3)
+
+_RE_SECTION = re.compile(r'^S\d+$')
+_RE_SUBSEC = re.compile(r'^S\d+\.SS\d+$')
+_RE_SUBSUBSEC = re.compile(r'^S\d+\.SS\d+\.SSS\d+$')
+
+# Prompt templates for generate_summary_for_node, filled with str.format
+_PARA_TMPL = """Providing an abstract of a scientific paper and a specific paragraph from the same paper. Please read both and then summarize the paragraph in the context of the abstract. 
+    <Abstract>
+    {abstract}
+    </Abstract>
+    <Paragraph>
+    {content}
+    </Paragraph>
+    <Requirement>
+    You are required to output a summary of the paragraph in the format of bullet points (in markdown). The summary should not be more than 50 words in total.
+    You are also required to output a keypoint for no more than 10 words which could use for a Table of Contents. 
+    Return your summary in JSON format with the following keys:
+    "summary" (str): The summary in markdown, with each bullet point in a new line and starting with a dash.
+    "keypoint" (str): The keypoint
+    </Requirement>
+        """
+
+_SECTION_TMPL = """
+        Please summarize the section of a scientific paper. 
+    <Abstract>
+    {abstract}
+    </Abstract>
+    <Contents>
+    {contents}
+    </Contents>
+    <Requirement>
+    You are required to output a summary of the section in the format of bullet points (in markdown). The summary should not be more than 100 words in total.
+    You are also required to output a keypoint of the section for no more than 30 words which could use for a Table of Contents. 
+    Notice that for both the summary and the keypoint describe, please start directly with meaningful content and DON'T add meaning less leading words like 'Thi paper tells'/'This paragraph tells'.
+    Return your summary in JSON format with the following keys:
+    "summary" (str): The summary in markdown, with each bullet point in a new line and starting with a dash.
+    "keypoint" (str): The keypoint
+    </Requirement>
+        """
 
 
 class ArxivNode(Node):
@@ -26,6 +72,7 @@ class ArxivNode(Node):
         self._label: str = label
         self._id: str = id
         self._html_soup: BeautifulSoup = source
+        self._markdown: str | None = None
 
     def get_label(self) -> str:
         return self._label
@@ -41,6 +88,18 @@ class ArxivNode(Node):
         for c in self._children:
             c._parent = self
 
+    def get_markdown(self) -> str:
+        """
+        The content in markdown, converted once. A paragraph's content is its tag serialized,
+        so the tag is converted directly instead of parsing the content again.
+        """
+        if self._markdown is None:
+            if self._label == "paragraph":
+                self._markdown = MarkdownConverter().convert_soup(self._html_soup).strip("\n")
+            else:
+                self._markdown = markdownify(self.content)
+        return self._markdown
+
 
 def replace_math_with_tex(soup: BeautifulSoup):
     for tag in soup.find_all("math", recursive=True):
@@ -67,23 +126,23 @@ def get_abstract_node(rootSoup: BeautifulSoup) -> ArxivNode:
     return ArxivNode(source, content_wraper.get('id'), "abstract", "Abstract", content_wraper.text)
 
 
-def get_section_nodes(rootSoup: BeautifulSoup) -> list[ArxivNode]:
+def get_section_nodes(rootSoup: BeautifulSoup, url: str) -> list[ArxivNode]:
     children = []
     for section in rootSoup.find_all('section', class_='ltx_section', recursive=True):
-        if not re.match(r'^S\d+$', section['id']):
+        if not _RE_SECTION.match(section['id']):
             continue
-        print(f"section: {section['id']}")
+        if verbose:
+            print(f"section: {section['id']}")
 
         Section = ArxivNode(section, section['id'], "section",
-                            section.find_all_next('h2', class_="ltx_title ltx_title_section")[0].text, "")
-        build_tree(Section)
+                            section.find('h2', class_="ltx_title ltx_title_section").text, "")
         children.append(Section)
-        print("----------")
+        if verbose:
+            print("----------")
     return children
 
 
-def get_subsection_nodes(sectionSoup: BeautifulSoup) -> list[ArxivNode]:
-    global arxiv_url
+def get_subsection_nodes(sectionSoup: BeautifulSoup, url: str) -> list[ArxivNode]:
     children = []
     index_para = 1
     index_figure = 1
@@ -91,11 +150,13 @@ def get_subsection_nodes(sectionSoup: BeautifulSoup) -> list[ArxivNode]:
         if not isinstance(e, Tag):
             continue
         class_ = e.get('class')
-        print(i, e.name, class_)
+        if verbose:
+            print(i, e.name, class_)
         if e.name == 'div' and ('ltx_para' in class_ or 'ltx_theorem' in class_):
             # if not re.match(r'^S\d+\.p.$', e['id']):
             #     continue
-            print(f"section: {e['id']}")
+            if verbose:
+                print(f"section: {e['id']}")
             # print(section)
             Paragraph = ArxivNode(e, e['id'], "paragraph",
                                   "¶ " + str(index_para),
@@ -103,22 +164,23 @@ def get_subsection_nodes(sectionSoup: BeautifulSoup) -> list[ArxivNode]:
             children.append(Paragraph)
             index_para += 1
         elif e.name == 'section' and 'ltx_subsection' in class_:
-            if not re.match(r'^S\d+\.SS\d+$', e['id']):
+            if not _RE_SUBSEC.match(e['id']):
                 continue
-            print(f"section: {e['id']}")
+            if verbose:
+                print(f"section: {e['id']}")
             # print(section)
             SubSection = ArxivNode(e, e['id'], "subsection",
                                    e.find('h3', class_="ltx_title ltx_title_subsection").text, "")
-            build_tree(SubSection)
             children.append(SubSection)
 
-            print("----------")
+            if verbose:
+                print("----------")
         elif e.name == 'figure':
             image_tags = e.find_all('img', class_='ltx_graphics', recursive=True)
             for image_tag in image_tags:
                 if image_tag is not None and isinstance(image_tag, Tag):
                     if 'src' in image_tag.attrs:
-                        image_tag['src'] = arxiv_url + '/' + image_tag['src']
+                        image_tag['src'] = url + '/' + image_tag['src']
                     if 'width' in image_tag.attrs and 'height' in image_tag.attrs:
                         # Make sure the image fit in the window
                         w, h = int(image_tag['width']), int(image_tag['height'])
@@ -137,12 +199,14 @@ def get_subsection_nodes(sectionSoup: BeautifulSoup) -> list[ArxivNode]:
 
 
 def remove_tag(html_str, tag):
-    import re
-    pattern = rf'<{tag}[^>]*>.*?</{tag}>'
-    return re.sub(pattern, '', html_str)
+    # html.parser keeps the fragment as is, lxml would wrap it in <html><body>
+    soup = BeautifulSoup(html_str, "html.parser")
+    for t in soup.find_all(tag):
+        t.decompose()
+    return str(soup)
 
 
-def get_paragraph_nodes(subsectionSoup: BeautifulSoup) -> list[ArxivNode]:
+def get_paragraph_nodes(subsectionSoup: BeautifulSoup, url: str) -> list[ArxivNode]:
     children = []
     index_para = 1
     index_figure = 1
@@ -150,7 +214,8 @@ def get_paragraph_nodes(subsectionSoup: BeautifulSoup) -> list[ArxivNode]:
         if not isinstance(e, Tag):
             continue
         class_ = e.get('class')
-        print(i, e.name, class_)
+        if verbose:
+            print(i, e.name, class_)
         if e.name == 'div' and ('ltx_para' in class_ or 'ltx_theorem' in class_):
             # if not re.match(r'^S\d+\.SS\d+\.p.$', e['id']):
             #     continue
@@ -161,15 +226,16 @@ def get_paragraph_nodes(subsectionSoup: BeautifulSoup) -> list[ArxivNode]:
             children.append(Paragraph)
             index_para += 1
 
-            print("----------")
+            if verbose:
+                print("----------")
         elif e.name == 'section' and 'ltx_subsubsection' in class_:
-            if not re.match(r'^S\d+\.SS\d+\.SSS\d+$', e['id']):
+            if not _RE_SUBSUBSEC.match(e['id']):
                 continue
-            print(f"section: {e['id']}")
+            if verbose:
+                print(f"section: {e['id']}")
             # print(section)
             SubSection = ArxivNode(e, e['id'], "subsection",
                                    e.find('h4', class_="ltx_title ltx_title_subsubsection").text, "")
-            build_tree(SubSection)
             children.append(SubSection)
         elif e.name == 'figure':
             # if not re.match(r'^S\d+\.SS\d+\.F\d+$', e['id']) and not re.match(r'alg\d+', e['id']):
@@ -178,7 +244,7 @@ def get_paragraph_nodes(subsectionSoup: BeautifulSoup) -> list[ArxivNode]:
             for image_tag in image_tags:
                 if image_tag is not None and isinstance(image_tag, Tag):
                     if 'src' in image_tag.attrs:
-                        image_tag['src'] = arxiv_url + '/' + image_tag['src']
+                        image_tag['src'] = url + '/' + image_tag['src']
                     if 'width' in image_tag.attrs and 'height' in image_tag.attrs:
                         # Make sure the image fit in the window
                         w, h = int(image_tag['width']), int(image_tag['height'])
@@ -195,7 +261,22 @@ def get_paragraph_nodes(subsectionSoup: BeautifulSoup) -> list[ArxivNode]:
     return children
 
 
-def build_tree(parent: ArxivNode):
+def build_tree(head: ArxivNode, url: str):
+    """
+    Build the tree, expanding the sections and subsections from a worklist instead of recursing.
+    """
+    work = [head]
+    while work:
+        parent = work.pop()
+        children = _expand_node(parent, url)
+        if children is None:
+            continue
+        parent.set_children(children)
+        # Reversed so that the sections are expanded in document order
+        work.extend(reversed([c for c in children if c.get_label() in ("section", "subsection")]))
+
+
+def _expand_node(parent: ArxivNode, url: str):
     if parent.get_id() == "root":
         title = parent.get_soup().find('h1', class_="ltx_title ltx_title_document", recursive=True)
         if title is None:
@@ -211,51 +292,91 @@ def build_tree(parent: ArxivNode):
 
         Abstract = get_abstract_node(parent.get_soup())
 
-        parent.set_children([Abstract] + get_section_nodes(parent.get_soup()))
+        return [Abstract] + get_section_nodes(parent.get_soup(), url)
 
     elif parent.get_label() == "section":
-        parent.set_children(get_subsection_nodes(parent.get_soup()))
+        return get_subsection_nodes(parent.get_soup(), url)
     elif parent.get_label() == "subsection":
-        parent.set_children(get_paragraph_nodes(parent.get_soup()))
-    return
+        return get_paragraph_nodes(parent.get_soup(), url)
+    return None
+
+
+@lru_cache(maxsize=64)
+def _fetch_html(url: str) -> bytes:
+    # Only the raw HTML is cached; the soup is mutated while building the tree
+    response = _SESSION.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.content
 
 
 def url_to_tree(url: str) -> ArxivNode:
-    global arxiv_url
-    arxiv_url = url
     print(f"Processing {url}")
-    html_source = requests.get(url).text
-    print("HTML source fetched successfully.", html_source[:1000])  # Print first 1000 characters for debugging
+    html_source = _fetch_html(url)
+    if verbose:
+        print("HTML source fetched successfully.", html_source[:1000].decode(errors="replace"))  # Print first 1000 characters for debugging
     # try:
     #     with open("cached_page.html", "r", encoding="utf-8") as f:
     #         html_source = f.read()
     # except FileNotFoundError:
     #     print("Error: Cached HTML file not found.")
 
-    html_source = re.sub(rf'href="([^\'\"]+)"', r'href="\1" target="_blank"', html_source)
-    soup = BeautifulSoup(html_source, "html.parser")
+    # Pass the raw bytes so lxml decodes while parsing
+    soup = BeautifulSoup(html_source, "lxml")
     replace_math_with_tex(soup)
     pre_process_html_tree(soup)
+    # Rewrite the links into the paper on the soup, so the node contents are built with them.
+    # The bib numbers of the anchors and the text of the first ltx_ref of each number are kept for the references.
+    bib_href_prefix = f'{url}#bib.bib'
+    bib_numbers = {}
+    ref_texts = {}
+    for tag in soup.find_all(href=True):
+        tag['target'] = '_blank'
+        href = tag['href']
+        if not href.startswith(url):
+            continue
+        number = href[len(bib_href_prefix):] if href.startswith(bib_href_prefix) else ""
+        if number.isdigit():
+            bib_numbers[id(tag)] = number
+            if tag.name == 'a' and 'ltx_ref' in tag.get('class', ()):
+                ref_texts.setdefault(number, tag.text)
+        # style takes the place of href
+        tag.attrs = {("style" if key == "href" else key): ("color: cyan;" if key == "href" else value)
+                     for key, value in tag.attrs.items()}
     head = ArxivNode(soup, "root", "root", "", "")
-    build_tree(head)
+    build_tree(head, url)
+    # The same references are cited from many paragraphs, so each bib item is looked up and formatted once
+    bib_items = {}
+    for item in soup.find_all('li', class_='ltx_bibitem'):
+        bib_items.setdefault(item.get('id'), item)
+    formatted_references = {}
     for c in head.iter_subtree_with_bfs():
-        html_string = c.content
-        pattern = rf'href="{url}#bib.bib(\d+)"'
-        matches = re.findall(pattern, html_string)
-        pattern = rf'href="{url}[^\'\"]*"'
-        c.content = re.sub(pattern, "style='color: cyan;'", html_string)
+        if c.get_label() not in ("paragraph", "figure"):
+            continue
+        matches = [bib_numbers[id(tag)] for tag in c.get_soup().find_all(style=True) if id(tag) in bib_numbers]
 
         if matches:
             references = []
             for number in matches:
-                ref_text = soup.find('a', class_='ltx_ref', href=re.compile(rf'^{url}#bib.bib{number}$')).text
-                ref_content = soup.find('li', class_='ltx_bibitem', recursive=True, id=f'bib.bib{number}')
-                references.append(f'<a style=\'color: cyan;\'>{ref_text}</a>{ref_content.__str__()}')
+                reference = formatted_references.get(number)
+                if reference is None:
+                    ref_content = bib_items.get(f'bib.bib{number}')
+                    reference = f'<a style=\'color: cyan;\'>{ref_texts[number]}</a>{ref_content.__str__()}'
+                    formatted_references[number] = reference
+                references.append(reference)
             set_reference_obj(c, references)
 
     return head
 
 
+def urls_to_trees(urls: List[str], max_workers: int = 16) -> List[ArxivNode]:
+    """
+    Fetch and parse several papers at once. The threads overlap the downloads with the parsing in lxml.
+    :return: The trees in the order of the urls
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(len(urls), max_workers))) as executor:
+        return list(executor.map(url_to_tree, urls))
+
+
 def generate_summary_of_abstract(root: Node):
     for node in root.iter_subtree_with_bfs():
         if node.title == "Abstract":
@@ -266,10 +387,9 @@ def generate_summary_of_abstract(root: Node):
                 </Abstract>
                 """
             try:
-                abstract_summary = chat.complete(expensive=high_quality_arxiv_summary, parse="dict", cache=True)[
-                    "summary"]
-                short_summary = chat.complete(expensive=high_quality_arxiv_summary, parse="dict", cache=True)["brief"]
-                return abstract_summary, short_summary
+                # The prompt asks for both fields in one JSON object
+                result = chat.complete(expensive=high_quality_arxiv_summary, parse="dict", cache=True)
+                return result["summary"], result["brief"]
             except Exception as e:
                 abstract = node.content
                 print(f"Error generating summary for abstract: {e}")
@@ -278,75 +398,102 @@ def generate_summary_of_abstract(root: Node):
             continue
 
 
-def generate_summary_for_node(node: ArxivNode, abstract: str) -> bool:
-    if node.get_label() == "figure":
-        Summary.get(node).content = None
-        return True
-    if len(node.children) == 0:
-        chat = Chat(dedent=True)
-        chat += f"""Providing an abstract of a scientific paper and a specific paragraph from the same paper. Please read both and then summarize the paragraph in the context of the abstract. 
+def summarize_paragraph_batch(batch: list[ArxivNode], abstract: str) -> bool:
+    paragraphs = "\n".join(
+        [f'<Paragraph id="{i}">\n{node.get_markdown()}\n</Paragraph>' for i, node in enumerate(batch)])
+    chat = Chat(dedent=True)
+    chat += f"""Providing an abstract of a scientific paper and several paragraphs from the same paper. Please read them and then summarize each paragraph in the context of the abstract. 
     <Abstract>
     {abstract}
     </Abstract>
-    <Paragraph>
-    {markdownify(node.content)}
-    </Paragraph>
+    {paragraphs}
     <Requirement>
-    You are required to output a summary of the paragraph in the format of bullet points (in markdown). The summary should not be more than 50 words in total.
-    You are also required to output a keypoint for no more than 10 words which could use for a Table of Contents. 
-    Return your summary in JSON format with the following keys:
+    For each paragraph, you are required to output a summary of the paragraph in the format of bullet points (in markdown). The summary should not be more than 50 words in total.
+    You are also required to output a keypoint for each paragraph for no more than 10 words which could use for a Table of Contents. 
+    Return your summaries in JSON format with a single key "summaries", whose value is a list of JSON objects with the following keys:
+    "id" (int): The id of the paragraph
     "summary" (str): The summary in markdown, with each bullet point in a new line and starting with a dash.
     "keypoint" (str): The keypoint
     </Requirement>
         """
+    try:
+        result = chat.complete(expensive=high_quality_arxiv_summary, parse="dict", cache=True)
+        items = result["summaries"]
+    except Exception as e:
+        # Paragraphs left without a summary fall back to generate_summary_for_node
+        print(f"Error generating batched summary: {e}")
+        return True
+    for item in items:
+        try:
+            i = int(item["id"])
+            summary, keypoint = item["summary"], item["keypoint"]
+        except (TypeError, KeyError, ValueError) as e:
+            print(f"Skipping malformed batched summary {item!r}: {e}")
+            continue
+        # The model may repeat an id or make one up
+        if not 0 <= i < len(batch) or Summary in batch[i].attrs:
+            continue
+        node = batch[i]
+        Summary.get(node).content = markdown(summary)
+        node.title = f"{node.title}: {keypoint}"
+    return True
+
+
+def batched_summarize(nodes: list[ArxivNode], abstract: str, batch_size: int = 8):
+    """
+    Summarize paragraph nodes with one LLM call per batch of batch_size paragraphs.
+    """
+    batches = [nodes[i:i + batch_size] for i in range(0, len(nodes), batch_size)]
+    for _ in parallel_map(partial(summarize_paragraph_batch, abstract=abstract), batches, n_workers=20,
+                          title="paragraph summary"):
+        pass
+
+
+def generate_summary_for_node(node: ArxivNode, abstract: str) -> bool:
+    if node.get_label() == "figure":
+        Summary.get(node).content = None
+        return True
+    if len(node.children) == 0:
+        if Summary in node.attrs:
+            # Already summarized by batched_summarize
+            return True
+        chat = Chat(dedent=True)
+        chat += _PARA_TMPL.format(abstract=abstract, content=node.get_markdown())
         try:
             result = chat.complete(expensive=high_quality_arxiv_summary, parse="dict", cache=True)
-            print("paragraph:", result)
-            if node.content == "":
-                print()
+            if verbose:
+                print("paragraph:", result)
             summary = markdown(result["summary"])
             Summary.get(node).content = summary
             node.title = f"{node.title}: {result['keypoint']}"
         except Exception as e:
             Summary.get(node).content = "Failed to generate summary"
     elif len(node.children) > 0:  # Section/ Subsection
-        chat = Chat(dedent=True)
+        # Check that the children are summarized and collect their summaries in one pass
+        content_list = []
         for e in node.children:
-            if Summary not in e.attrs:
+            child_summary = e.get_attr_or_none(Summary)
+            if child_summary is None:
                 return False
-        content_list = [Summary.get(e).content for e in node.children if
-                        Summary in e.attrs and Summary.get(e).content != None]
+            if child_summary.content is not None:
+                content_list.append(child_summary.content)
         contents = "\n".join(content_list)
-        chat += f"""
-        Please summarize the section of a scientific paper. 
-    <Abstract>
-    {abstract}
-    </Abstract>
-    <Contents>
-    {contents}
-    </Contents>
-    <Requirement>
-    You are required to output a summary of the section in the format of bullet points (in markdown). The summary should not be more than 100 words in total.
-    You are also required to output a keypoint of the section for no more than 30 words which could use for a Table of Contents. 
-    Notice that for both the summary and the keypoint describe, please start directly with meaningful content and DON'T add meaning less leading words like 'Thi paper tells'/'This paragraph tells'.
-    Return your summary in JSON format with the following keys:
-    "summary" (str): The summary in markdown, with each bullet point in a new line and starting with a dash.
-    "keypoint" (str): The keypoint
-    </Requirement>
-        """
+        chat = Chat(dedent=True)
+        chat += _SECTION_TMPL.format(abstract=abstract, contents=contents)
         try:
             result = chat.complete(expensive=high_quality_arxiv_summary, parse="dict", cache=True)
-            print(f"section{node.get_id()}:{result}")
-            summary1 = markdown(result["summary"])
-            short_summary = result['keypoint']
-            Summary.get(node).content = summary1
-            Summary.get(node).short_content = short_summary
+            if verbose:
+                print(f"section{node.get_id()}:{result}")
+            node_summary = Summary.get(node)
+            node_summary.content = markdown(result["summary"])
+            node_summary.short_content = result['keypoint']
 
             node_title_summary = []
             for child in node.children:
                 node_title_summary.append(f"<strong>{child.title}</strong>")
-                if Summary.get(child).short_content:
-                    node_title_summary.append(f"{Summary.get(child).short_content}")
+                short_content = child.attrs[Summary].short_content
+                if short_content:
+                    node_title_summary.append(f"{short_content}")
 
             node_content = '\n\n<br/>'.join(node_title_summary)
             node.content = node_content
@@ -359,12 +506,27 @@ def generate_summary_for_node(node: ArxivNode, abstract: str) -> bool:
     return True
 
 
-def generate_tree_with_url(url: str, host: str) -> str:
-    arxiv_url = url  # "https://arxiv.org/html/2407.12105v2"
-    doc = url_to_tree(arxiv_url)
-    abstract_summary, short_summary = generate_summary_of_abstract(doc)
-
-    for node in doc.iter_subtree_with_bfs():
+async def agenerate_summary_for_node(node: ArxivNode, abstract: str) -> bool:
+    """
+    The async version of generate_summary_for_node.
+    Sections whose children are not summarized yet return without taking a worker thread.
+    """
+    if node.get_label() != "figure" and any(Summary not in child.attrs for child in node.children):
+        return False
+    # mllm is synchronous, so the request runs on a worker thread
+    return await asyncio.to_thread(generate_summary_for_node, node, abstract)
+
+
+def prepare_tree_for_summary(doc: ArxivNode) -> list[ArxivNode]:
+    """
+    Fill in the contents of the leaf sections, merge single-paragraph sections and remove the Abstract,
+    all in one walk of the tree.
+    :return: The remaining nodes in BFS order
+    """
+    nodes = list(doc.iter_subtree_with_bfs())
+    removed = set()
+    abstract_node = None
+    for node in nodes:
         if "section" in node._label:
             if len(node.children) == 0:
                 node.content = node._html_soup.__str__()
@@ -373,16 +535,30 @@ def generate_tree_with_url(url: str, host: str) -> str:
                 if child._label == "paragraph":
                     node.content = child.content
                     child.remove_self()
+                    removed.add(child)
         if node._label == "figure":
-            print(node._id)
+            if verbose:
+                print(node._id)
+        if abstract_node is None and node.title == "Abstract" and node not in removed:
+            abstract_node = node
+
+    if abstract_node is not None:
+        abstract_node.remove_self()
+        removed.add(abstract_node)
+    return [node for node in nodes if node not in removed]
 
-    for node in doc.iter_subtree_with_bfs():
-        if node.title == "Abstract":
-            node.remove_self()
-            break
 
-    node_map_with_dependency(doc.iter_subtree_with_bfs(), partial(generate_summary_for_node, abstract=abstract_summary),
-                             n_workers=20)
+def generate_tree_with_url(url: str, host: str) -> str:
+    arxiv_url = url  # "https://arxiv.org/html/2407.12105v2"
+    doc = url_to_tree(arxiv_url)
+    abstract_summary, short_summary = generate_summary_of_abstract(doc)
+
+    nodes = prepare_tree_for_summary(doc)
+    paragraphs = [node for node in nodes if node.get_label() == "paragraph" and len(node.children) == 0]
+    batched_summarize(paragraphs, abstract_summary)
+    run_coroutine(anode_map_with_dependency(nodes,
+                                            partial(agenerate_summary_for_node, abstract=abstract_summary),
+                                            max_concurrency=20), max_workers=20)
     construct_related_figures(doc)
     doc.content = ""
     Summary.get(doc).content = abstract_summary
@@ -419,25 +595,12 @@ if __name__ == "__main__":
     doc = url_to_tree(arxiv_url)
     abstract_summary, short_summary = generate_summary_of_abstract(doc)
 
-    for node in doc.iter_subtree_with_bfs():
-        if "section" in node._label:
-            if len(node.children) == 0:
-                node.content = node._html_soup.__str__()
-            if len(node.children) == 1:
-                child = node.children[0]
-                if child._label == "paragraph":
-                    node.content = child.content
-                    child.remove_self()
-        if node._label == "figure":
-            print(node._id)
-
-    for node in doc.iter_subtree_with_bfs():
-        if node.title == "Abstract":
-            node.remove_self()
-            break
-
-    node_map_with_dependency(doc.iter_subtree_with_bfs(), partial(generate_summary_for_node, abstract=abstract_summary),
-                             n_workers=20)
+    nodes = prepare_tree_for_summary(doc)
+    paragraphs = [node for node in nodes if node.get_label() == "paragraph" and len(node.children) == 0]
+    batched_summarize(paragraphs, abstract_summary)
+    run_coroutine(anode_map_with_dependency(nodes,
+                                            partial(agenerate_summary_for_node, abstract=abstract_summary),
+                                            max_concurrency=20), max_workers=20)
     construct_related_figures(doc)
     doc.content = ""
     Summary.get(doc).content = abstract_summary
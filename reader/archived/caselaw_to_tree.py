@@ -1,86 +1,78 @@
 import re
 
-from bs4 import Tag
+from bs4 import BeautifulSoup, Tag
 
 
 from tree import Node
+from reader.html_to_raw_tree import SoupInfo, html_to_tree
 from reader.reference import set_reference_obj
 
 
+# Roman numerals I to X are made of these letters
+first_level_chars = frozenset("IVX")
+second_level_chars = frozenset("ABCDEFGH*")
+# Numbers 1 to 10 all contain one of these digits
+third_level_chars = frozenset("123456789")
+
+
+# Print the reference numbers found in the segments
+verbose = False
+
+footnote_pattern = re.compile(r'name="\[(\d+)\]')
+reference_pattern = re.compile(r'name="r\[(\d+)\]"')
+
+
 def is_first_level(node: Node) -> bool:
-    first_level = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
-    return any(s in node.title[:5] for s in first_level)
+    return not first_level_chars.isdisjoint(node.title[:5])
 
 
 def is_second_level(node: Node) -> bool:
-    second_level = ["A", "B", "C", "D", "E", "F", "G", "H", "*"]
-    return any(s in node.title[:1] for s in second_level)
+    return node.title[:1] in second_level_chars
 
 
 def is_third_level(node: Node) -> bool:
-    third_level = ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10"]
-    return any(s in node.title[:2] for s in third_level)
+    return not third_level_chars.isdisjoint(node.title[:2])
 
 
-def remove_page_num(root: Node):
-    for node in root.iter_subtree_with_dfs():
-        soup_attr = SoupInfo.get(node)
-        soup = soup_attr.soup
-        # remove all the elements whose class is "gsl_pagenum" or "gsl_pagenum2"
-        for tag in soup.find_all(class_=lambda x: x and 'gsl_pagenum' in x, recursive=True):
-            tag.decompose()
-    SoupInfo.soup_to_content(root)
+def remove_page_num(soup: BeautifulSoup):
+    # remove all the elements whose class is "gsl_pagenum" or "gsl_pagenum2"
+    for tag in soup.find_all(class_=lambda x: x and 'gsl_pagenum' in x, recursive=True):
+        tag.decompose()
 
 
-def merge_blockquote(root: Node):
+def clean_tree(root: Node):
     """
-    Merge blockquote into the previous node.
-    :param root:
-    :return:
-    """
-    nodes_to_remove = []
-    for node in root.iter_subtree_with_dfs():
-        soup_attr = SoupInfo.get(node)
-        soup = soup_attr.soup
-        if soup.blockquote:
-            node_index = node.index_in_siblings()
-            if node_index == 0:
-                continue
-            previous_node = node.parent.children[node_index - 1]
-            previous_soup = SoupInfo.get(previous_node).soup
-            previous_soup.append(soup.blockquote)
-            soup.decompose()
-            nodes_to_remove.append(node)
-    for node in nodes_to_remove:
-        node.remove_self()
-    SoupInfo.soup_to_content(root)
-
-
-def merge_small_segment(root: Node):
-    """
-    Merge small segment into the previous node.
+    Remove page numbers, then merge blockquotes and small segments into the previous sibling,
+    all in one traversal. The contents are rebuilt from the soups once at the end.
     :param root:
     :return:
     """
     small_bound = 100
     too_large_bound = 500
     nodes_to_remove = []
-    for node in root.iter_subtree_with_dfs():
-        if node.has_child():
-            continue
-        soup_attr = SoupInfo.get(node)
-        soup = soup_attr.soup
-        if len(soup.text) < small_bound:
-            node_index = node.index_in_siblings()
-            if node_index == 0:
-                continue
-            previous_node = node.parent.children[node_index - 1]
-            previous_soup = SoupInfo.get(previous_node).soup
-            if len(previous_soup.text) > too_large_bound:
-                continue
-            previous_soup.append(soup)
-            soup.decompose()
-            nodes_to_remove.append(node)
+    remove_page_num(SoupInfo.get(root).soup)
+    stack = [root]
+    while len(stack) > 0:
+        node = stack.pop()
+        # Merges go to the last sibling that is kept, so that no content lands in a removed node
+        previous_soup = None
+        for child in node.children:
+            soup = SoupInfo.get(child).soup
+            remove_page_num(soup)
+            if previous_soup is not None:
+                if soup.blockquote:
+                    previous_soup.append(soup.blockquote)
+                    soup.decompose()
+                    nodes_to_remove.append(child)
+                    continue
+                if not child.has_child() and len(soup.text) < small_bound \
+                        and len(previous_soup.text) <= too_large_bound:
+                    previous_soup.append(soup)
+                    soup.decompose()
+                    nodes_to_remove.append(child)
+                    continue
+            previous_soup = soup
+            stack.append(child)
     for node in nodes_to_remove:
         node.remove_self()
     SoupInfo.soup_to_content(root)
@@ -91,9 +83,7 @@ def get_caselaw_tree(html: str) -> Node:
     doc = doc.children[0]
     last_first_level = doc
     last_second_level = doc
-    num = 1
     for child in list(doc.children):
-        num += 1
         if is_first_level(child):
             last_first_level = child
         elif is_second_level(child):
@@ -101,28 +91,26 @@ def get_caselaw_tree(html: str) -> Node:
             last_second_level = child
         elif is_third_level(child):
             child.new_parent(last_second_level)
-    remove_page_num(doc)
-    merge_blockquote(doc)
-    merge_small_segment(doc)
+    clean_tree(doc)
+    # The paragraphs of the footnotes, by the name of their anchor
+    footnotes = {}
+    for t in soup.find_all('a', class_='gsl_hash', recursive=True):
+        if isinstance(t, Tag) and t.parent.name == 'p':
+            footnotes.setdefault(t.get('name'), []).append(t.parent.__str__())
     for c in doc.iter_subtree_with_bfs():
         if len(c.children) == 0:  # Add reference to nodes
             html_string = c.content
 
-            pattern = r'name="\[(\d+)\]'
-            if re.findall(pattern, html_string):
+            if footnote_pattern.search(html_string):
                 c._parent.remove_child(c)
                 continue
-            pattern = r'name="r\[(\d+)\]"'
-            matches = re.findall(pattern, html_string)
+            matches = reference_pattern.findall(html_string)
             if matches:
                 references = []
                 for number in matches:
-                    print(number)
-                    possible_contents = soup.find_all('a', class_='gsl_hash', recursive=True)
-                    for t in possible_contents:
-                        if isinstance(t, Tag) and t.get('name') == f'[{number}]' and t.parent.name == 'p':
-                            print(t.parent)
-                            references.append(t.parent.__str__())
+                    if verbose:
+                        print(number)
+                    references.extend(footnotes.get(f'[{number}]', []))
                 set_reference_obj(c, references)
         elif any("Segment" == cc.title[:7] for cc in c.children):
             for i, cc in enumerate([cc for cc in c.children if "Segment" == cc.title[:7]]):
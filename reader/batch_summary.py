@@ -0,0 +1,88 @@
+import json
+import textwrap
+import time
+
+from openai import OpenAI
+
+from tree import Node
+from reader.build_summary import leaf_summary_prompt, apply_leaf_summary, leaf_title_prompt, \
+    apply_leaf_title
+
+batch_model = "gpt-4o-mini"
+poll_interval = 10
+finished_status = ["completed", "failed", "expired", "cancelled"]
+
+
+def _batch_request(custom_id: str, prompt: str) -> dict:
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": batch_model,
+            "messages": [{"role": "user", "content": textwrap.dedent(prompt)}],
+            "response_format": {"type": "json_object"},
+        },
+    }
+
+
+def _parse_batch_output(output: str) -> dict[str, dict]:
+    results = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        try:
+            content = response["body"]["choices"][0]["message"]["content"]
+            results[record["custom_id"]] = json.loads(content)
+        except (KeyError, IndexError, json.JSONDecodeError):
+            continue
+    return results
+
+
+def submit_leaf_batch(nodes: list[Node]) -> set[Node]:
+    """
+    Summarize the leaf nodes with a single OpenAI Batch API job.
+    The prompts are the same as generate_summary_for_leaf_node.
+    Blocks until the batch finishes, which can take minutes.
+    :return: The nodes that were fully summarized. The others should go through
+    generate_summary_for_leaf_node.
+    """
+    nodes_by_id = {str(node.node_id): node for node in nodes}
+    batch_requests = []
+    for node_id, node in nodes_by_id.items():
+        batch_requests.append(_batch_request(f"points-{node_id}", leaf_summary_prompt(node)))
+        if not node.title:
+            batch_requests.append(_batch_request(f"title-{node_id}", leaf_title_prompt(node)))
+    if len(batch_requests) == 0:
+        return set()
+
+    client = OpenAI()
+    batch_input = "\n".join(json.dumps(request) for request in batch_requests).encode()
+    input_file = client.files.create(file=("leaf_summaries.jsonl", batch_input), purpose="batch")
+    batch = client.batches.create(input_file_id=input_file.id, endpoint="/v1/chat/completions",
+                                  completion_window="24h")
+    while batch.status not in finished_status:
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+    if batch.status != "completed" or batch.output_file_id is None:
+        print(f"Leaf summary batch {batch.id} ended with status {batch.status}")
+        return set()
+
+    results = _parse_batch_output(client.files.content(batch.output_file_id).text)
+    summarized = set()
+    for node_id, node in nodes_by_id.items():
+        points = results.get(f"points-{node_id}")
+        if points is None or "points" not in points:
+            continue
+        if not node.title:
+            title = results.get(f"title-{node_id}")
+            if title is None or "title" not in title:
+                continue
+            apply_leaf_title(node, title)
+        apply_leaf_summary(node, points)
+        summarized.add(node)
+    return summarized
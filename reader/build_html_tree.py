@@ -1,10 +1,18 @@
+import asyncio
+import hashlib
+import re
+import threading
+from collections import deque
+
 from mllm import Chat
-from tenacity import retry, wait_fixed, stop_after_attempt
+from mllm.utils import parallel_map
+from tenacity import retry, wait_random_exponential, stop_after_attempt
 
 from tree import Node
-from tree.helper import node_map_with_dependency
-from reader.build_summary import generate_summary_for_leaf_node, \
-    generate_summary_for_section_node
+from tree.helper import anode_map_with_dependency, run_coroutine
+from reader.build_summary import agenerate_summary_for_leaf_node, \
+    agenerate_summary_for_section_node
+from reader.cache_provider import get_cached, save_cache
 from reader.html_to_raw_tree import html_to_tree
 from reader.summary import Summary
 from dotenv import load_dotenv
@@ -12,14 +20,14 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-def generate_summary_for_node(node: Node) -> bool:
+async def agenerate_summary_for_node(node: Node) -> bool:
     if len(node.children) == 0:
-        generate_summary_for_leaf_node(node)
+        await agenerate_summary_for_leaf_node(node)
     elif len(node.children) > 0:  # Section/ Subsection
         for e in node.children:
             if Summary not in e.attrs:
                 return False
-        generate_summary_for_section_node(node)
+        await agenerate_summary_for_section_node(node)
     else:
         if Summary not in node.attrs:
             Summary.get(node).content = None
@@ -27,6 +35,54 @@ def generate_summary_for_node(node: Node) -> bool:
 
 
 small_node_limit = 1000
+# Summarize the leaves through the OpenAI Batch API. Cheaper, but may take minutes to hours.
+use_batch_api = False
+
+
+def merge_untitled_siblings(node: Node):
+    """
+    Merge runs of small untitled children forward into the last child of the run.
+    Each run is joined once instead of being re-concatenated for every sibling.
+    """
+    children = node.children
+    run = []
+    run_len = 0
+    for i, child in enumerate(children):
+        if run:
+            run_len += len("<br/>")
+        run.append(child.content)
+        run_len += len(child.content)
+        if i + 1 < len(children) and child.title == "" and children[i + 1].title == "" \
+                and run_len < small_node_limit:
+            child.content = ""
+            continue
+        if len(run) > 1:
+            child.content = "<br/>".join(run)
+        run = []
+        run_len = 0
+
+
+def _cleanup_pass(root: Node):
+    """
+    Clean up the subtree in one post-order traversal with an explicit stack:
+    merge small untitled siblings, drop empty leaves and inline single leaf children.
+    """
+    stack = [(root, False)]
+    while len(stack) > 0:
+        node, children_done = stack.pop()
+        if not children_done:
+            # Merge before the children are touched so it sees their original content
+            merge_untitled_siblings(node)
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+            continue
+        if node.title == "" and node.content == "" and len(node.children) == 0:
+            node.remove_self()
+            continue
+        if len(node.children) == 1:
+            if len(node.first_child().children) == 0:
+                node.content = node.first_child().content
+                node.first_child().remove_self()
 
 
 def build_html_tree(html_source)->Node:
@@ -38,32 +94,18 @@ def build_html_tree(html_source)->Node:
     doc_root = build_hierarchical_tree_iteratively(children, doc)
     doc_root._parent = None
 
-    for node in doc_root.iter_subtree_with_dfs():
-        if len(node.children) == 0:
-            continue
-        for i, child in enumerate(node.children):
-            if i + 1 == len(node.children):
-                continue
-            if child.title == "" and node.children[i + 1].title == "":
-                if len(node.children[i].content) < small_node_limit:
-                    node.children[i + 1].content = node.children[i].content + "<br/>" + \
-                                                   node.children[
-                                                       i + 1].content
-                    node.children[i].content = ""
-
-    for node in list(doc_root.iter_subtree_with_dfs()):
-        if node.title == "" and node.content == "" and len(node.children) == 0:
-            node.remove_self()
+    _cleanup_pass(doc_root)
 
-    for node in list(doc_root.iter_subtree_with_dfs()):
-        if len(node.children) == 1:
-            if len(node.first_child().children) == 0:
-                node.content = node.first_child().content
-                node.first_child().remove_self()
+    nodes_to_summarize = list(doc_root.iter_subtree_with_bfs())
+    if use_batch_api:
+        from reader.batch_summary import submit_leaf_batch
+        leaves = [node for node in nodes_to_summarize if len(node.children) == 0]
+        summarized = submit_leaf_batch(leaves)
+        nodes_to_summarize = [node for node in nodes_to_summarize if node not in summarized]
 
-    node_map_with_dependency(doc_root.iter_subtree_with_bfs(),
-                             generate_summary_for_node,
-                             n_workers=20)
+    run_coroutine(anode_map_with_dependency(nodes_to_summarize,
+                                            agenerate_summary_for_node,
+                                            max_concurrency=20), max_workers=20)
 
     # Extract and set the root title based on top-level section titles
     root_title = extract_root_title_from_sections(doc_root)
@@ -73,7 +115,8 @@ def build_html_tree(html_source)->Node:
 
 
 # We use @retry on the function that makes the actual API call
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
+# Jittered backoff keeps concurrent workers from retrying in lockstep on rate limits
+@retry(stop=stop_after_attempt(5), wait=wait_random_exponential(min=1, max=20))
 def extract_root_title_from_sections(root_node):
     """
     Extracts a title for the root node based on its top-level section titles.
@@ -100,17 +143,53 @@ Return a JSON dict with:
 "title": string containing the proposed document title
 """
     
+    cache_key = "htmltree:root_title:" + hashlib.sha256(prompt.encode()).hexdigest()
+    cached_title = get_cached(cache_key)
+    if cached_title is not None:
+        return cached_title
+
     response = Chat(prompt).complete(cache=False, parse="dict", expensive=True)
-    return response.get("title", "Document")
+    title = response.get("title", "Document")
+    save_cache(cache_key, title)
+    return title
+
 
+def _format_candidate(i, node):
+    title = node.title.strip()[:120]
+    if title:
+        return f'<{i}> {title}'
+    # Untitled nodes get a short content snippet so that they can be told apart
+    snippet = " ".join(node.content[:40].split())
+    return f'<{i}> Content: {snippet}...'
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-def get_child_titles_from_llm(potential_children):
+
+max_hierarchy_concurrency = 10
+# Shared by all the hierarchy tasks and their window threads, so that this is the real cap on LLM calls
+_hierarchy_llm_slots = threading.BoundedSemaphore(max_hierarchy_concurrency)
+
+
+@retry(stop=stop_after_attempt(5), wait=wait_random_exponential(min=1, max=20))
+def _complete_child_indices(prompt, n_candidates):
+    # The user's original code used `chat.add` and `chat.complete`.
+    # Emulating a stateless call for clarity in recursion.
+    # You may need to adjust this based on your `apyll` library usage.
+    with _hierarchy_llm_slots:
+        response = Chat(prompt).complete(cache=False, parse="dict", expensive=True)
+    section_title_index = sorted(set(int(i) for i in response["top_headers"]))
+    invalid = [i for i in section_title_index if i < 0 or i >= n_candidates]
+    if invalid:
+        raise ValueError(f"Invalid header indices {invalid} for {n_candidates} headers")
+    return section_title_index
+
+
+def get_child_indices_from_llm(potential_children):
     """
     Calls the language model to get the direct children for a parent.
+    The prompt is built once and reused by the retries.
+    :return: The sorted indices of the direct children in potential_children
     """
     candidate_titles = "\n".join(
-        [f'<{i}>: "' + node.title + '"' + "Content:" + '' + node.content[:100] +'...' for i, node in enumerate(potential_children)])
+        [_format_candidate(i, node) for i, node in enumerate(potential_children)])
     prompt = f"""
 The following is a list of all the headers in a section of an article.
 The headers are listed by their order to appear in the article.
@@ -124,19 +203,87 @@ Return a JSON dict keys:
 "analysis": string for an analysis of who are the top headers.
 "top_headers": int[] for the <index> of the top headers in the list.
 """
-    # The user's original code used `chat.add` and `chat.complete`.
-    # Emulating a stateless call for clarity in recursion.
-    # You may need to adjust this based on your `apyll` library usage.
-    response = Chat(prompt).complete(cache=False, parse="dict", expensive=True)
-    section_title_index = response["top_headers"]
-    valid_titles = [node.title for node in potential_children]
-    section_titles = [valid_titles[i] for i in section_title_index]
-    return section_titles
+    cache_key = "htmltree:child_titles:" + hashlib.sha256(prompt.encode()).hexdigest()
+    section_title_index = get_cached(cache_key)
+    if section_title_index is not None:
+        return section_title_index
+    section_title_index = _complete_child_indices(prompt, len(potential_children))
+    save_cache(cache_key, section_title_index)
+    return section_title_index
+
+
+hierarchy_window_size = 20
+# Windows grow up to this size when a pass filters nothing out
+max_hierarchy_window_size = 160
 
 
-def find_and_attach_children(parent_node, potential_children):
+def get_child_indices_by_windows(potential_children, window_size=hierarchy_window_size):
     """
-    Recursively finds and attaches child nodes to a parent. Any nodes that appear
+    Gets the top-level headers of a long list of candidates with bounded prompts.
+    The candidates are split into windows and each window keeps its own top headers.
+    A top header of the whole list is also a top header of its window, so the
+    survivors are queried again until they fit into a single window.
+    When a pass keeps every candidate, the windows are doubled, up to max_hierarchy_window_size.
+    No prompt holds more than max_hierarchy_window_size candidates.
+    :return: The sorted indices of the top-level headers in potential_children
+    """
+
+    def select_in(indices):
+        return get_child_indices_from_llm([potential_children[i] for i in indices])
+
+    candidates = list(range(len(potential_children)))
+    while len(candidates) > window_size:
+        windows = [candidates[i:i + window_size] for i in range(0, len(candidates), window_size)]
+        window_tops = [None] * len(windows)
+        for i, tops in parallel_map(select_in, windows, n_workers=min(len(windows), 20),
+                                    title="hierarchy"):
+            window_tops[i] = tops
+        promoted = []
+        for window, tops in zip(windows, window_tops):
+            promoted.extend(window[k] for k in tops)
+        if len(promoted) == len(candidates):
+            if window_size >= max_hierarchy_window_size:
+                # Every window keeps all of its candidates, so they are all top headers
+                return candidates
+            # Nothing was filtered out, larger windows show more of the structure
+            window_size = min(window_size * 2, max_hierarchy_window_size)
+        candidates = promoted
+    if not candidates:
+        return []
+    return [candidates[k] for k in select_in(candidates)]
+
+
+# Matches section numbers like "2", "3." or "1.2.1" at the start of a title
+# The leading number has at most two digits, so that titles like "2020 Results" are not taken as numbered
+_SECTION_NUMBER_PATTERN = re.compile(r'(\d{1,2}(?:\.\d+)*)\.?(?:\s|$)')
+
+
+def get_child_indices_by_heuristic(potential_children):
+    """
+    Finds the direct children without the LLM when the candidates are obviously flat.
+    The headers are siblings when they are numbered at the same depth under the same
+    parent number, and the last part of the numbers increases.
+    :return: The sorted indices of the direct children, or None if the LLM is needed
+    """
+    titled_indices = [i for i, node in enumerate(potential_children) if node.title.strip()]
+    if len(titled_indices) <= 1:
+        # At most one header, the untitled nodes after it belong to it
+        return titled_indices
+    numbers = []
+    for i in titled_indices:
+        match = _SECTION_NUMBER_PATTERN.match(potential_children[i].title.strip())
+        if match is None:
+            return None
+        numbers.append([int(part) for part in match.group(1).split(".")])
+    for previous, number in zip(numbers, numbers[1:]):
+        if len(number) != len(previous) or number[:-1] != previous[:-1] or number[-1] <= previous[-1]:
+            return None
+    return titled_indices
+
+
+async def find_and_attach_children(parent_node, potential_children):
+    """
+    Finds and attaches the direct children of a parent. Any nodes that appear
     before the first identified top-level child are automatically attached as
     direct children of the parent node.
 
@@ -144,74 +291,76 @@ def find_and_attach_children(parent_node, potential_children):
         parent_node (Node): The node to which children will be attached.
         potential_children (list): A list of Node objects that are candidates
                                    to be children of the parent_node.
+    Returns:
+        list: The (child, grandchildren candidates) pairs that still need to be processed.
     """
     if not potential_children:
-        return  # Base case: no more candidates to process for this parent.
-
+        return []  # Base case: no more candidates to process for this parent.
 
-    # 1. Identify direct children using the LLM
-    direct_child_titles = get_child_titles_from_llm(potential_children)
+    # 1. Identify direct children, using the LLM only when the headers are ambiguous
+    direct_child_indices = get_child_indices_by_heuristic(potential_children)
+    if direct_child_indices is None:
+        direct_child_indices = await asyncio.to_thread(get_child_indices_by_windows, potential_children)
 
-    if not direct_child_titles:
+    if not direct_child_indices:
         # No sections found, attach all nodes as direct children
         for node in potential_children:
             node.change_parent(parent_node)
-        return
+        return []
 
-    # 2. Map titles back to actual Node objects and record their original indices
-    child_nodes_with_indices = []
-    for i, node in enumerate(potential_children):
-        if node.title in direct_child_titles:
-            child_nodes_with_indices.append({'node': node, 'index': i})
-    
-    first_top_level_children_index = child_nodes_with_indices[0]['index']
+    first_top_level_children_index = direct_child_indices[0]
     if first_top_level_children_index != 0:
         # Nodes before the first top-level child should be direct children
         for i in range(first_top_level_children_index):
             potential_children[i].change_parent(parent_node)
 
-    # 3. Attach children and recurse for each child
-    for i, child_info in enumerate(child_nodes_with_indices):
-        child_node: Node = child_info['node']
-        original_index = child_info['index']
+    # 2. Attach children and collect the scope of each child
+    work_items = []
+    for i, original_index in enumerate(direct_child_indices):
+        child_node: Node = potential_children[original_index]
 
         # Attach the found child to its parent
         child_node.change_parent(parent_node)
 
         # Determine the scope of potential grandchildren for this new child.
         # These are the nodes between this child and the next sibling.
+        # The nodes after the last child fall into its scope.
         start_scope = original_index + 1
         end_scope = None
 
         # If there is a next sibling, the scope ends before it.
-        if i + 1 < len(child_nodes_with_indices):
-            end_scope = child_nodes_with_indices[i + 1]['index']
+        if i + 1 < len(direct_child_indices):
+            end_scope = direct_child_indices[i + 1]
 
         # Get the list of potential grandchildren
         grandchildren_candidates = potential_children[start_scope:end_scope]
-
-        # 🚀 RECURSIVE CALL
-        # Now, do the same process for the new child and its potential children.
         if grandchildren_candidates:
-            find_and_attach_children(child_node, grandchildren_candidates)
-
-    # 4. Handle nodes after the last top-level child
-    last_child_index = child_nodes_with_indices[-1]['index']
-    remaining_nodes = potential_children[last_child_index + 1:]
-    if remaining_nodes:
-        # Attach remaining nodes to the last child
-        last_child = child_nodes_with_indices[-1]['node']
-        find_and_attach_children(last_child, remaining_nodes)
+            work_items.append((child_node, grandchildren_candidates))
+    return work_items
 
 
 # --- Main Execution Logic ---
 
+async def _build_hierarchical_tree(all_nodes, root_node):
+    # The scopes of the work items are disjoint, so they can be processed concurrently
+    # A new item starts as soon as any running one finishes, without waiting for the whole level
+    frontier = deque([(root_node, all_nodes)])
+    running = set()
+    while frontier or running:
+        while frontier and len(running) < max_hierarchy_concurrency:
+            parent_node, potential_children = frontier.popleft()
+            running.add(asyncio.create_task(find_and_attach_children(parent_node, potential_children)))
+        done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            frontier.extend(task.result())
+    return root_node
+
+
 def build_hierarchical_tree_iteratively(all_nodes, root_node):
     """
     Builds a full hierarchical tree from a flat list of nodes.
     """
-    find_and_attach_children(root_node, all_nodes)
-    return root_node
+    return run_coroutine(_build_hierarchical_tree(all_nodes, root_node), max_workers=max_hierarchy_concurrency)
 
 
 if __name__ == '__main__':
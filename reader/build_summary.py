@@ -1,10 +1,15 @@
+import asyncio
+import hashlib
 import os
+import threading
 
 from markdownify import markdownify
+import mllm
 from mllm import Chat
 
 from tree import Node
-from reader.nature_paper_to_tree import PaperNode
+from reader.cache_provider import get_cached, save_cache
+from reader.paper_node import PaperNode
 from reader.summary import Summary
 high_quality_arxiv_summary = False
 from mllm.cache.cache_service import caching
@@ -12,25 +17,18 @@ caching._cache_kv.inactive = False if os.environ.get("RAILWAY_PUBLIC_DOMAIN") is
 
 
 def generate_summary_of_abstract(root: Node):
-    for node in root.iter_subtree_with_bfs():
-        if node.title == "Abstract":
-            chat = Chat()
-            chat += f"""This is an Abstract of a scientific paper, please write a 80 words summary about what this paper about from the summary, and a 20 words brief describe about the content. For both the summary and the brief describe, please start directly with meaningful content and DON'T add meaning less leading words like 'Thi paper tells'/'This paragraph tells'. return the summary in JSON format with the tag "summary", and the brief describe with tag "brief".
+    abstract_node = next((node for node in root.iter_subtree_with_bfs() if node.title == "Abstract"), None)
+    if abstract_node is None:
+        return None
+    chat = Chat()
+    chat += f"""This is an Abstract of a scientific paper, please write a 80 words summary about what this paper about from the summary, and a 20 words brief describe about the content. For both the summary and the brief describe, please start directly with meaningful content and DON'T add meaning less leading words like 'Thi paper tells'/'This paragraph tells'. return the summary in JSON format with the tag "summary", and the brief describe with tag "brief".
                 <Abstract>
-                {markdownify(node.content)}
+                {markdownify(abstract_node.content)}
                 </Abstract>
                 """
-            abstract_summary = \
-                chat.complete(expensive=high_quality_arxiv_summary, parse="dict",
-                              cache=True)[
-                    "summary"]
-            short_summary = \
-                chat.complete(expensive=high_quality_arxiv_summary, parse="dict",
-                              cache=True)["brief"]
-
-            return abstract_summary, short_summary
-        return None
-    return None
+    result = chat.complete(expensive=high_quality_arxiv_summary, parse="dict",
+                           cache=True)
+    return result["summary"], result["brief"]
 
 
 def generate_summary_for_node(node: Node) -> bool:
@@ -51,21 +49,44 @@ def generate_summary_for_node(node: Node) -> bool:
     return True
 
 
-def generate_summary_for_section_node(node):
+async def agenerate_summary_for_node(node: Node) -> bool:
+    """
+    The async version of generate_summary_for_node.
+    """
+    if node.get_label() in ["figure", "table"]:
+        Summary.get(node).content = None
+        return True
+
+    if len(node.children) == 0:
+        await agenerate_summary_for_leaf_node(node)
+    elif len(node.children) > 0:  # Section/ Subsection
+        for e in node.children:
+            if Summary not in e.attrs:
+                return False
+        await agenerate_summary_for_section_node(node)
+    else:
+        if Summary not in node.attrs:
+            Summary.get(node).content = None
+    return True
+
+
+def section_contents(node) -> str:
     content_list = []
     for e in node.children:
-        if Summary in e.attrs and Summary.get(e).has_summary():
-            if Summary.get(e).short_content != "":
-                content_list.append("# " + Summary.get(e).short_content)
+        summary = e.get_attr_or_none(Summary)
+        if summary is not None and summary.has_summary():
+            if summary.short_content != "":
+                content_list.append("# " + summary.short_content)
             else:
                 content_list.append("# Subsection")
-            content_list.append(Summary.get(e).get_summary_for_resummary())
+            content_list.append(summary.get_summary_for_resummary())
             content_list.append("---")
 
-    contents = "\n".join(content_list)
+    return "\n".join(content_list)
 
-    chat = Chat(dedent=True)
-    chat += f"""
+
+def section_summary_prompt(contents: str) -> str:
+    return f"""
     Please summarize the content of the section.
     <Contents>
     {contents}
@@ -76,25 +97,24 @@ def generate_summary_for_section_node(node):
     "point" (str): A key point of the section contents. The key point should be a complete sentence stating an important facts. You don't need to start with "The section discusses" or similar phrases.
     </Requirement>
         """
-    try:
-        result = chat.complete(expensive=False, parse="dict",
-                               cache=True)
-        Summary.get(node).summaries_with_evidence = result["points"]
 
-        node_title_summary = []
-        for child in node.children:
-            node_title_summary.append(f"<strong>{child.title}</strong>")
-            if Summary.get(child).short_content:
-                node_title_summary.append(f"{Summary.get(child).short_content}")
 
-        node_content = '\n\n<br/>'.join(node_title_summary)
-        node.content = node_content
+def apply_section_summary(node, result):
+    Summary.get(node).summaries_with_evidence = result["points"]
 
-    except Exception as e:
-        Summary.get(node).content = "Failed to generate summary"
+    node_title_summary = []
+    for child in node.children:
+        node_title_summary.append(f"<strong>{child.title}</strong>")
+        short_content = Summary.get(child).short_content
+        if short_content:
+            node_title_summary.append(f"{short_content}")
+
+    node_content = '\n\n<br/>'.join(node_title_summary)
+    node.content = node_content
 
-    chat = Chat(dedent=True)
-    chat += f"""Please summarize the content of the section.
+
+def section_short_summary_prompt(contents: str) -> str:
+    return f"""Please summarize the content of the section.
     <Contents>
     {contents}
     </Contents>
@@ -103,14 +123,90 @@ def generate_summary_for_section_node(node):
     Return your summary in with a JSON with a single key "summary", whose value is a string.
     </Requirement>
     """
-    result = chat.complete(expensive=False, parse="dict",
-                           cache=True)
+
+
+def apply_section_short_summary(node, result):
     Summary.get(node).short_content = result["summary"]
 
 
-def generate_summary_for_leaf_node(node):
-    chat = Chat(dedent=True)
-    chat += f"""Please summarize the paragraph . 
+# Locks of the prompts being completed, so that repeated paragraphs are only sent once
+_pending_lock = threading.Lock()
+_pending: dict[str, threading.Lock] = {}
+
+
+def _complete(prompt: str, required_keys: tuple[str, ...], expensive: bool = False):
+    """
+    The results are also kept in Redis, which outlives the process and is shared by the workers.
+    The local mllm cache is turned off on the server.
+    Prompts that only differ in whitespace share the result, as long as the model is the same.
+    :param required_keys: The keys the result must have. Results without them are not cached
+    """
+    model = mllm.config.default_models.expensive if expensive else mllm.config.default_models.normal
+    cache_key = "summary:" + hashlib.sha256(
+        f"{model}:{expensive}:{' '.join(prompt.split())}".encode()).hexdigest()
+    result = get_cached(cache_key)
+    if result is not None:
+        return result
+    with _pending_lock:
+        key_lock = _pending.setdefault(cache_key, threading.Lock())
+    try:
+        with key_lock:
+            # The same prompt may have been completed while waiting
+            result = get_cached(cache_key)
+            if result is None:
+                chat = Chat(dedent=True)
+                chat += prompt
+                result = chat.complete(expensive=expensive, parse="dict", cache=True)
+                if all(key in result for key in required_keys):
+                    save_cache(cache_key, result)
+    finally:
+        with _pending_lock:
+            _pending.pop(cache_key, None)
+    return result
+
+
+def generate_summary_for_section_node(node):
+    contents = section_contents(node)
+
+    try:
+        result = _complete(section_summary_prompt(contents), ("points",))
+        apply_section_summary(node, result)
+    except Exception as e:
+        Summary.get(node).content = "Failed to generate summary"
+
+    result = _complete(section_short_summary_prompt(contents), ("summary",))
+    apply_section_short_summary(node, result)
+
+
+async def _acomplete(prompt: str, required_keys: tuple[str, ...]):
+    # mllm is synchronous, so the request runs on a worker thread
+    return await asyncio.to_thread(_complete, prompt, required_keys)
+
+
+async def agenerate_summary_for_section_node(node):
+    """
+    The async version of generate_summary_for_section_node.
+    The key points and the short summary are requested concurrently.
+    """
+    contents = section_contents(node)
+    result, short_result = await asyncio.gather(
+        _acomplete(section_summary_prompt(contents), ("points",)),
+        _acomplete(section_short_summary_prompt(contents), ("summary",)),
+        return_exceptions=True)
+    try:
+        if isinstance(result, Exception):
+            raise result
+        apply_section_summary(node, result)
+    except Exception as e:
+        Summary.get(node).content = "Failed to generate summary"
+
+    if isinstance(short_result, Exception):
+        raise short_result
+    apply_section_short_summary(node, short_result)
+
+
+def leaf_summary_prompt(node) -> str:
+    return f"""Please summarize the paragraph . 
     <Paragraph>
     {Summary.get(node).get_content_for_summary()}
     </Paragraph>
@@ -120,19 +216,18 @@ def generate_summary_for_leaf_node(node):
     "point" (str): A key point of the paragraph. The key point should be a complete sentence stating an important facts. You don't need to start with "The paragraph discusses" or similar phrases.
     </Requirement>
     """
-    try:
-        result = chat.complete(expensive=False, parse="dict", cache=True)
-        Summary.get(node).summaries_with_evidence = result["points"]
-        new_children = PaperNode(None, label="paragraph")
-        node.add_child(new_children)
-        new_children.content = node.content
-        Summary.get(new_children)
-    except Exception as e:
-        Summary.get(node).content = "Failed to generate summary"
 
-    if not node.title:
-        chat = Chat(dedent=True)
-        chat += f"""Here is an abstract of a scientific paper and a specific paragraph from the same paper.
+
+def apply_leaf_summary(node, result):
+    Summary.get(node).summaries_with_evidence = result["points"]
+    new_children = PaperNode(None, label="paragraph")
+    node.add_child(new_children)
+    new_children.content = node.content
+    Summary.get(new_children)
+
+
+def leaf_title_prompt(node) -> str:
+    return f"""Here is an abstract of a scientific paper and a specific paragraph from the same paper.
         <Paragraph>
         {node.content}
         </Paragraph>
@@ -141,6 +236,41 @@ def generate_summary_for_leaf_node(node):
         Return your title in with a JSON with a single key "title", whose value is a string.
         </Requirement>
         """
-        result = chat.complete(expensive=False, parse="dict",
-                               cache=True)
-        node.title = f"""¶ {result["title"]}"""
+
+
+def apply_leaf_title(node, result):
+    node.title = f"""¶ {result["title"]}"""
+
+
+def generate_summary_for_leaf_node(node):
+    try:
+        result = _complete(leaf_summary_prompt(node), ("points",))
+        apply_leaf_summary(node, result)
+    except Exception as e:
+        Summary.get(node).content = "Failed to generate summary"
+
+    if not node.title:
+        result = _complete(leaf_title_prompt(node), ("title",))
+        apply_leaf_title(node, result)
+
+
+async def agenerate_summary_for_leaf_node(node):
+    """
+    The async version of generate_summary_for_leaf_node.
+    The key points and the title are requested concurrently.
+    """
+    tasks = [_acomplete(leaf_summary_prompt(node), ("points",))]
+    if not node.title:
+        tasks.append(_acomplete(leaf_title_prompt(node), ("title",)))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        if isinstance(results[0], Exception):
+            raise results[0]
+        apply_leaf_summary(node, results[0])
+    except Exception as e:
+        Summary.get(node).content = "Failed to generate summary"
+
+    if len(results) > 1:
+        if isinstance(results[1], Exception):
+            raise results[1]
+        apply_leaf_title(node, results[1])
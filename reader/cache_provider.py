@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from redis import ConnectionPool, Redis
+from redis.exceptions import RedisError
+
+redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379")
+# Seconds before a cached LLM result expires
+cache_ttl = 30 * 24 * 3600
+# Seconds to skip Redis after it fails, so that each call does not wait for a timeout
+redis_retry_interval = 30
+
+# Nothing connects until the first command
+redis_pool = ConnectionPool.from_url(redis_url, max_connections=16, socket_timeout=0.25,
+                                     socket_connect_timeout=0.25, decode_responses=True)
+redis_client = Redis(connection_pool=redis_pool)
+# Used when Redis can't be reached, the least recently used entries are dropped past the limit
+fallback_cache_limit = 4096
+fallback_cache: OrderedDict[str, str] = OrderedDict()
+# The cache is used from the summary worker threads
+_fallback_lock = threading.Lock()
+
+_redis_down_until = 0.0
+
+
+def _mark_redis_down(e: Exception) -> None:
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + redis_retry_interval
+    print(f"Redis connection failed, continuing without Redis: {e}")
+
+
+def _get_redis() -> Optional[Redis]:
+    """
+    :return: The Redis client, or None if Redis failed recently
+    """
+    if time.monotonic() < _redis_down_until:
+        return None
+    return redis_client
+
+
+def get_cached(key: str) -> Optional[Any]:
+    """
+    :return: The cached JSON value of the key, or None if it is not cached
+    """
+    client = _get_redis()
+    value = None
+    if client is not None:
+        try:
+            value = client.get(key)
+        except RedisError as e:
+            _mark_redis_down(e)
+    if value is None:
+        with _fallback_lock:
+            value = fallback_cache.get(key)
+            if value is not None:
+                fallback_cache.move_to_end(key)
+    if value is None:
+        return None
+    return json.loads(value)
+
+
+def save_cache(key: str, value: Any) -> None:
+    data = json.dumps(value)
+    client = _get_redis()
+    if client is not None:
+        try:
+            client.set(key, data, ex=cache_ttl)
+            return
+        except RedisError as e:
+            _mark_redis_down(e)
+    with _fallback_lock:
+        fallback_cache[key] = data
+        fallback_cache.move_to_end(key)
+        if len(fallback_cache) > fallback_cache_limit:
+            fallback_cache.popitem(last=False)
@@ -1,13 +1,20 @@
 import html
 import re
-from typing import List
+from typing import List, Union
 
 import html2text
-import requests
 from bs4 import BeautifulSoup, PageElement, Tag
 
 from tree import Node
 from tree.node_attr import Attr
+from tree.session import REQUEST_TIMEOUT, make_session
+
+_HN_PATTERN = re.compile(r"h[1-6]")
+_SCHOLAR_CASE_PATTERN = re.compile(r'^/scholar_case.+$')
+
+_SESSION = make_session(pool_maxsize=20,
+                        user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 '
+                                   '(KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36')
 
 
 class SoupInfo(Attr):
@@ -22,14 +29,16 @@ class SoupInfo(Attr):
 
 
 def url_to_tree(url: str) -> (Node, BeautifulSoup):
-    browser_headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36'}
-    html = requests.get(url, headers=browser_headers).text
-    return html_to_tree(html)
+    response = _SESSION.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    # The raw bytes go to lxml, which decodes them by the page's meta charset
+    return html_to_tree(response.content)
 
 
-def html_to_tree(html: str) -> (Node, BeautifulSoup):
-    soup = BeautifulSoup(html, "html.parser")
+def html_to_tree(html: Union[str, bytes]) -> (Node, BeautifulSoup):
+    # The whole page goes through lxml, the node fragments below stay on html.parser,
+    # which does not wrap them in <html><body>
+    soup = BeautifulSoup(html, "lxml")
     pre_process_html_tree(soup)
     title = soup.find("title")
     if title:
@@ -66,8 +75,8 @@ def pre_process_html_tree(soup: BeautifulSoup):
 
     herf_tags = soup.find_all('a', recursive=True)
     for tag in herf_tags:
-        if isinstance(tag, Tag) and tag.get('href') is not None and re.match(
-                r'^/scholar_case.+$', tag.get('href')):
+        if isinstance(tag, Tag) and tag.get('href') is not None and _SCHOLAR_CASE_PATTERN.match(
+                tag.get('href')):
             tag['href'] = "https://scholar.google.com" + tag.get('href')
 
 
@@ -99,7 +108,6 @@ def unwrap_elements(root: Node, elements: List[str]):
 
 
 def html_to_raw_tree(soup: BeautifulSoup, title="") -> Node:
-    hn_pattern = re.compile(r"h[1-6]")
     root = Node()
     curr_node = root.s(title)
     node_stack = []
@@ -108,7 +116,7 @@ def html_to_raw_tree(soup: BeautifulSoup, title="") -> Node:
     for child in soup.children:
         child = unwrap_useless_tags(child)
         # check whether it's hn use regex
-        if hasattr(child, "name") and child.name and hn_pattern.match(child.name):
+        if hasattr(child, "name") and child.name and _HN_PATTERN.match(child.name):
             set_content(curr_node, curr_content)
             this_level = int(child.name[1])
             if this_level > curr_level:
@@ -5,91 +5,98 @@ This module converts Nature journal articles from HTML to a tree structure
 for the SuperReader application.
 """
 
+import copy
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple, Union
 from urllib.parse import urljoin
 
 import mllm.config
-import requests
-from bs4 import BeautifulSoup, Tag
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 
 from tree import Node
-from tree.helper import node_map_with_dependency
+from tree.helper import anode_map_with_dependency, run_coroutine
+from tree.session import REQUEST_TIMEOUT, make_session
+from reader.build_summary import agenerate_summary_for_node
+from reader.paper_node import PaperNode
+from reader.reference import construct_related_figures
 
 # Configuration
 NOT_DOWNLOAD_FIGURES_TABLE = False
+# Print the progress of the parsing
+verbose = False
 BASE_URL = 'https://link.springer.com'
 
+_SESSION = make_session(pool_maxsize=50, retries=2)
 
-class PaperNode(Node):
-    """A specialized Node class for representing paper content."""
-    
-    def __init__(self, source: BeautifulSoup, label: str, title: str = "", content: str = ""):
-        super().__init__(title, content)
-        self._label: str = label
-        self._html_soup: BeautifulSoup = source
-
-    def get_label(self) -> str:
-        """Get the node label."""
-        return self._label
-
-    def get_soup(self) -> BeautifulSoup:
-        """Get the BeautifulSoup object."""
-        return self._html_soup
-
-    def set_soup(self, soup: BeautifulSoup) -> None:
-        """Set the BeautifulSoup object."""
-        self._html_soup = soup
-
-    def set_children(self, children: List[Node]) -> None:
-        """Set children and establish parent relationships."""
-        self._children = children
-        for child in self._children:
-            child._parent = self
+_BRACE_PATTERN = re.compile(r'[{}]')
+_REF_CR_PATTERN = re.compile(r'#ref-CR')
+# Anchors rewritten in the leaf nodes
+_NAVIGATION_ACTIONS = frozenset({'section anchor', 'figure anchor'})
+_PILL_BUTTON_CLASS = 'c-article__pill-button'
+# Only the article header and body are parsed, the navigation, sidebars and footer are skipped.
+# The outermost matching tag is kept with all its content.
+_ARTICLE_STRAINER = SoupStrainer(["main", "article", "div", "section", "h1", "ul"],
+                                 attrs={"class": re.compile(r"c-article|main-content")})
+_TABLE_STRAINER = SoupStrainer("div", attrs={"class": re.compile(r"\bc-article-table-container\b")})
+# Creates detached tags, the node soups are often plain Tags without new_tag
+_TAG_FACTORY = BeautifulSoup("", "lxml")
 
 
 # ============================================================================
 # HTML Processing Utilities
 # ============================================================================
 
-def pre_process_html_tree(soup: BeautifulSoup) -> None:
-    """Remove script and style tags from the HTML."""
-    for script in soup(["script", "style"]):
-        script.decompose()
+def _absolutize(href: str, origin: str = BASE_URL) -> str:
+    """
+    Make a link absolute against an origin such as BASE_URL, without parsing the URL like urljoin.
+    Nature's links are absolute, rooted at "/" or protocol-relative.
+    """
+    if href.startswith(('http://', 'https://')):
+        return href
+    if href.startswith('//'):
+        return origin[:origin.index(':') + 1] + href
+    if href.startswith('/'):
+        return origin + href
+    return origin + '/' + href
+
+
+def pre_process_html_tree(soup: BeautifulSoup, base_url: str) -> None:
+    """
+    Remove script and style tags and pill buttons, and convert relative links to absolute URLs in one walk.
+    The "view table" pill buttons are kept, _extract_table follows them to the full-size tables.
+    """
+    if verbose:
+        print(f"Processing links with base URL: {base_url}")
+    origin = urljoin(base_url, '/').rstrip('/')
+    for tag in soup.find_all(True):
+        if tag.name in ("script", "style"):
+            tag.decompose()
+        elif tag.name == "a":
+            if (_PILL_BUTTON_CLASS in tag.get('class', ())
+                    and tag.get('data-track-action') != 'view table'):
+                tag.decompose()
+                continue
+            href = tag.get('href', '')
+            if isinstance(href, str) and href.startswith('/'):
+                tag['href'] = _absolutize(href, origin)
+                tag['target'] = '_blank'
 
 
 def replace_math_with_tex(soup: BeautifulSoup) -> None:
     """Replace MathJax elements with TeX tags."""
     for math in soup.find_all('span', class_='mathjax-tex'):
         script = math.text
-        tex_element = BeautifulSoup("", "html.parser")
-        tex_element.append(tex_element.new_tag('TeX', src=script))
-        math.replace_with(tex_element)
+        math.replace_with(_TAG_FACTORY.new_tag('TeX', src=script))
 
 
 def replace_braces(soup: BeautifulSoup) -> None:
     """Replace braces in text with HTML entities."""
-    elements_to_replace = []
-    for element in soup.find_all(text=True):
-        element_text = str(element)
-        if '{' not in element_text and '}' not in element_text:
-            continue
-        new_soup = BeautifulSoup("", "html.parser")
-        new_element = new_soup.new_tag('TextSpan', text=element_text)
-        elements_to_replace.append((element, new_element))
-    
-    for old, new in elements_to_replace:
-        old.replace_with(new)
-
-
-def complete_relative_links(soup: BeautifulSoup, base_url: str) -> None:
-    """Convert relative links to absolute URLs."""
-    print(f"Processing links with base URL: {base_url}")
-    for link in soup.find_all('a', href=True, recursive=True):
-        href = link.get('href', '')
-        if isinstance(href, str) and href.startswith('/'):
-            link['href'] = urljoin(base_url, href)
-            link['target'] = '_blank'
+    # Only the text nodes with a brace are visited
+    elements_to_replace = soup.find_all(string=_BRACE_PATTERN)
+    for element in elements_to_replace:
+        element.replace_with(_TAG_FACTORY.new_tag('TextSpan', text=str(element)))
 
 
 # ============================================================================
@@ -118,12 +125,11 @@ def get_section_nodes(root_soup: BeautifulSoup, sec_dict: Dict[str, str]) -> Lis
         raise ValueError("Can't resolve main content. This is usually due to the page not being open access.")
     
     section_index = 1
-    for section in main_content.children:
-        if not isinstance(section, Tag):
-            continue
-            
+    # Only the child tags, the text between them is skipped
+    for section in main_content.find_all(True, recursive=False):
         section_title = section.get('data-title', '')
-        print(f"Processing section: {section_title}")
+        if verbose:
+            print(f"Processing section: {section_title}")
         
         section_content = section.find('div', class_='c-article-section__content')
         if not section_content:
@@ -142,7 +148,6 @@ def get_section_nodes(root_soup: BeautifulSoup, sec_dict: Dict[str, str]) -> Lis
         if sec_id and sec_id.get('id'):
             sec_dict[sec_id['id']] = section_node.node_id
         
-        build_tree(section_node, sec_dict)
         children.append(section_node)
     
     return children
@@ -152,18 +157,60 @@ def get_section_nodes(root_soup: BeautifulSoup, sec_dict: Dict[str, str]) -> Lis
 # Subsection and Element Processing
 # ============================================================================
 
+_LEAF_NAMES = frozenset({'p', 'ol'})
+_LEAF_DIV_CLASSES = frozenset({'c-article-equation', 'c-article-table'})
+
+
 def _is_leaf_element(element: Tag) -> bool:
     """Check if an element is a leaf node (paragraph, list, equation, or table)."""
-    if element.name == 'p' or element.name == 'ol':
+    name = element.name
+    if name in _LEAF_NAMES:
         return True
     
-    if element.name == 'div':
-        classes = element.get('class', [])
-        return bool(set(classes) & {'c-article-equation', 'c-article-table'})
+    if name == 'div':
+        classes = element.get('class')
+        return bool(classes) and not _LEAF_DIV_CLASSES.isdisjoint(classes)
     
     return False
 
 
+@lru_cache(maxsize=128)
+def _fetch_table_html(url: str) -> Optional[str]:
+    """
+    Download a full-size table page and cut out its table container.
+    The whole page is parsed here, on the prefetch threads, so building the tree only parses the container.
+    Failed downloads raise and are not cached.
+    """
+    response = _SESSION.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    page_soup = BeautifulSoup(response.content, 'lxml', parse_only=_TABLE_STRAINER)
+    table_container = page_soup.find('div', class_='c-article-table-container')
+    if table_container is None:
+        return None
+    pre_process_html_tree(table_container, url)
+    return str(table_container)
+
+
+def _try_fetch_table_html(url: str) -> None:
+    try:
+        _fetch_table_html(url)
+    except Exception:
+        # Retried and reported when the table is extracted
+        pass
+
+
+def prefetch_tables(soup: BeautifulSoup) -> None:
+    """Download the full-size tables of the page concurrently, so that building the tree hits the cache."""
+    if NOT_DOWNLOAD_FIGURES_TABLE:
+        return
+    table_urls = {_absolutize(link['href'])
+                  for link in soup.find_all('a', {'data-track-action': 'view table'}, href=True)}
+    if not table_urls:
+        return
+    with ThreadPoolExecutor(max_workers=min(len(table_urls), 16)) as executor:
+        list(executor.map(_try_fetch_table_html, table_urls))
+
+
 def _extract_table(element: Tag, section_soup: BeautifulSoup) -> Optional[PaperNode]:
     """Extract table content and create a table node."""
     def _get_fullsize_table_soup(table_element: Tag) -> Optional[BeautifulSoup]:
@@ -174,18 +221,16 @@ def _extract_table(element: Tag, section_soup: BeautifulSoup) -> Optional[PaperN
             return None
         
         relative_href = table_link_tag['href']
-        full_url = urljoin(BASE_URL, relative_href)
+        full_url = _absolutize(relative_href)
         
         try:
-            response = requests.get(full_url)
-            if response.status_code == 200:
-                return BeautifulSoup(response.text, 'html.parser')
-            else:
-                print(f"Error fetching table: {response.status_code}")
-                return None
+            table_html = _fetch_table_html(full_url)
         except Exception as e:
             print(f"Error fetching table: {e}")
             return None
+        if table_html is None:
+            return None
+        return BeautifulSoup(table_html, 'lxml')
 
     # Get table content
     table_soup = _get_fullsize_table_soup(element)
@@ -205,7 +250,8 @@ def _extract_table(element: Tag, section_soup: BeautifulSoup) -> Optional[PaperN
     table_container['style'] = 'font-size: 60%;'
     section_soup.append(table_container)
     
-    return PaperNode(table_container, "table", table_title, str(table_container))
+    # The content is serialized after the leaf processing in html_to_tree
+    return PaperNode(table_container, "table", table_title)
 
 
 def _extract_figure(element: Tag, sec_dict: Dict[str, str]) -> Optional[PaperNode]:
@@ -214,23 +260,24 @@ def _extract_figure(element: Tag, sec_dict: Dict[str, str]) -> Optional[PaperNod
     
     if a_tag and a_tag.has_attr('href') and not NOT_DOWNLOAD_FIGURES_TABLE:
         relative_url = a_tag['href']
-        full_url = urljoin(BASE_URL, relative_url)
+        full_url = _absolutize(relative_url)
         try:
             # Currently disabled for speed
-            response = None  # requests.get(full_url)
+            response = None  # _SESSION.get(full_url, timeout=REQUEST_TIMEOUT)
             #print(f'Fetching figure from: {full_url}')
             if response and response.status_code == 200:
-                fetched_html = response.text
-                soup = BeautifulSoup(fetched_html, 'html.parser')
+                fetched_html = response.content
+                soup = BeautifulSoup(fetched_html, 'lxml')
                 img_tag = soup.find('article')
-                img_html = str(img_tag) if img_tag else str(element)
+                img_html = str(img_tag) if img_tag else ""
             else:
-                img_html = str(element)
+                img_html = ""
         except Exception as e:
             print(f"Error fetching figure: {e}")
-            img_html = str(element)
+            img_html = ""
     else:
-        img_html = str(element)
+        # Serialized from the element after the leaf processing in html_to_tree
+        img_html = ""
 
     # Extract figure caption
     caption_tag = element.find('b', attrs={'data-test': "figure-caption-text"})
@@ -274,7 +321,7 @@ def get_subsection_nodes(section_soup: BeautifulSoup, label: str, sec_dict: Dict
         # Handle leaf elements
         elif is_leading and _is_leaf_element(element):
             if element.name == 'p':
-                paragraph_node = PaperNode(element, "paragraph", "", str(element))
+                paragraph_node = PaperNode(element, "paragraph")
                 prev_para_node = paragraph_node
                 children.append(paragraph_node)
             elif 'c-article-table' in element.get('class', []):
@@ -285,8 +332,7 @@ def get_subsection_nodes(section_soup: BeautifulSoup, label: str, sec_dict: Dict
             else:
                 # Append equation or keypoints to previous paragraph
                 if prev_para_node:
-                    new_soup = BeautifulSoup("<div></div>", "html.parser")
-                    new_div = new_soup.div
+                    new_div = _TAG_FACTORY.new_tag("div")
                     new_div.append(prev_para_node.get_soup())
                     new_div.append(element)
                     prev_para_node.set_soup(new_div)
@@ -308,28 +354,27 @@ def get_subsection_nodes(section_soup: BeautifulSoup, label: str, sec_dict: Dict
             if temp_parent and subsection_title and subsection_id:
                 subsection_node = PaperNode(temp_parent, "subsection", subsection_title, "")
                 sec_dict[subsection_id] = subsection_node.node_id
-                build_tree(subsection_node, sec_dict)
                 children.append(subsection_node)
             
             # Start new subsection
             is_leading = False
-            soup = BeautifulSoup("", "html.parser")
-            temp_parent = soup.new_tag("div")
+            temp_parent = _TAG_FACTORY.new_tag("div")
             subsection_title = element.get_text(strip=True).strip()
             subsection_id = element.get('id')
-            print("----------")
+            if verbose:
+                print("----------")
         
         # Add to current subsection
         elif temp_parent:
             temp_parent.append(element)
         else:
-            print(f"Discarded element: {element.name}")
+            if verbose:
+                print(f"Discarded element: {element.name}")
     
     # Finalize last subsection
     if temp_parent and subsection_title and subsection_id:
         subsection_node = PaperNode(temp_parent, "subsection", subsection_title, "")
         sec_dict[subsection_id] = subsection_node.node_id
-        build_tree(subsection_node, sec_dict)
         children.append(subsection_node)
     
     return children
@@ -339,8 +384,21 @@ def get_subsection_nodes(section_soup: BeautifulSoup, label: str, sec_dict: Dict
 # Tree Building
 # ============================================================================
 
-def build_tree(parent: PaperNode, sec_dict: Dict[str, str]) -> None:
-    """Build the tree structure recursively."""
+def build_tree(head: PaperNode, sec_dict: Dict[str, str]) -> None:
+    """Build the tree structure, expanding the sections and subsections from a worklist instead of recursing."""
+    work = [head]
+    while work:
+        parent = work.pop()
+        children = _expand_node(parent, sec_dict)
+        if children is None:
+            continue
+        parent.set_children(children)
+        # Reversed so that the sections are expanded in document order
+        work.extend(reversed([child for child in children if child.get_label() in ("section", "subsection")]))
+
+
+def _expand_node(parent: PaperNode, sec_dict: Dict[str, str]) -> Optional[List[PaperNode]]:
+    """:return: The children of the node, or None if the node is not expanded."""
     if parent.get_label() == "root":
         # Extract title
         title_element = parent.get_soup().find('h1', class_="c-article-title", recursive=True)
@@ -359,91 +417,80 @@ def build_tree(parent: PaperNode, sec_dict: Dict[str, str]) -> None:
         
         # Extract abstract and sections
         abstract_node = get_abstract_node(parent.get_soup())
-        print(f"Abstract: {abstract_node.content}")
+        if verbose:
+            print(f"Abstract: {abstract_node.content}")
         
         section_nodes = get_section_nodes(parent.get_soup(), sec_dict)
-        parent.set_children([abstract_node] + section_nodes)
+        return [abstract_node] + section_nodes
     
     elif parent.get_label() in ["section", "subsection"]:
-        subsection_nodes = get_subsection_nodes(parent.get_soup(), parent.get_label(), sec_dict)
-        parent.set_children(subsection_nodes)
+        return get_subsection_nodes(parent.get_soup(), parent.get_label(), sec_dict)
+    
+    return None
 
 
 # ============================================================================
 # HTML to Tree Conversion
 # ============================================================================
 
-def html_to_tree(html_source: str, url: str) -> Tuple[PaperNode, BeautifulSoup]:
+def html_to_tree(html_source: Union[str, bytes], url: str) -> Tuple[PaperNode, BeautifulSoup]:
     """Convert HTML source to a tree structure."""
-    soup = BeautifulSoup(html_source, "html.parser")
-    complete_relative_links(soup, url)
-    pre_process_html_tree(soup)
+    soup = BeautifulSoup(html_source, "lxml", parse_only=_ARTICLE_STRAINER)
+    pre_process_html_tree(soup, url)
+    prefetch_tables(soup)
     
     head = PaperNode(soup, "root", "", "")
     sec_dict: Dict[str, str] = {}
     build_tree(head, sec_dict)
     
-    # Process leaf nodes
-    for node in head.iter_subtree_with_bfs():
-        if len(node.children) > 0:
-            continue
-        
-        if isinstance(node, PaperNode):
-            replace_math_with_tex(node.get_soup())
-            replace_braces(node.get_soup())
+    # Papers link to the same sections many times, the navigators are copied from here
+    nav_cache: Dict[Tuple[str, str], Tag] = {}
     
-    # Process navigation and links
-    for node in head.iter_subtree_with_bfs():
-        if len(node.children) > 0:
-            continue
-        
+    # Process leaf nodes in a single pass
+    for node in head.iter_leaves():
         if not isinstance(node, PaperNode):
             continue
             
         node_soup = node.get_soup()
+        replace_math_with_tex(node_soup)
+        replace_braces(node_soup)
         
-        # Process section and figure anchors
-        anchors = node_soup.find_all('a', attrs={
-            'data-track-action': ['section anchor', 'figure anchor']
-        })
-        
-        for anchor in anchors:
+        # Rewrite the section and figure anchors and figure links in one search,
+        # the pill buttons left by pre_process_html_tree are the table links
+        for anchor in node_soup.find_all('a'):
             href = anchor.get('href', '')
-            if '#' in href:
+            if anchor.get('data-track-action') in _NAVIGATION_ACTIONS and '#' in href:
                 anchor_key = href.split('#')[-1]
-                link_text = anchor.get_text(strip=True)
-                
-                node_nav = soup.new_tag('NodeNavigator')
-                node_nav['nodeId'] = sec_dict.get(anchor_key, '0')
-                
-                new_a = soup.new_tag('a')
-                new_a.string = link_text
-                node_nav.append(new_a)
-                anchor.replace_with(node_nav)
-        
-        # Process figure links
-        figure_links = node_soup.find_all('a', attrs={"data-test": "img-link"})
-        for link in figure_links:
-            link.attrs.pop('href', None)
-            figure_box = soup.new_tag('FigureBox')
-            img = link.find('img')
-            if img:
-                figure_box.append(img)
-            link.replace_with(figure_box)
+                nav_key = (sec_dict.get(anchor_key, '0'), anchor.get_text(strip=True))
+                node_nav = nav_cache.get(nav_key)
+                if node_nav is None:
+                    node_nav = soup.new_tag('NodeNavigator')
+                    node_nav['nodeId'] = nav_key[0]
+                    
+                    new_a = soup.new_tag('a')
+                    new_a.string = nav_key[1]
+                    node_nav.append(new_a)
+                    nav_cache[nav_key] = node_nav
+                anchor.replace_with(copy.copy(node_nav))
+            elif anchor.get('data-test') == 'img-link':
+                anchor.attrs.pop('href', None)
+                figure_box = soup.new_tag('FigureBox')
+                img = anchor.find('img')
+                if img:
+                    figure_box.append(img)
+                anchor.replace_with(figure_box)
+            elif _PILL_BUTTON_CLASS in anchor.get('class', ()):
+                anchor.decompose()
         
-        # Remove pill buttons
-        pill_buttons = node_soup.find_all('a', attrs={"class": "c-article__pill-button"})
-        for button in pill_buttons:
-            button.decompose()
-        
-        node.content = str(node_soup)
+        node.finalize_content()
     
     return head, soup
 
 
 def url_to_tree(url: str) -> Tuple[PaperNode, BeautifulSoup]:
     """Convert a URL to a tree structure."""
-    html_source = requests.get(url).text
+    # lxml decodes the bytes by the page's meta charset, requests does not have to guess the encoding
+    html_source = _SESSION.get(url, timeout=REQUEST_TIMEOUT).content
     return html_to_tree(html_source, url)
 
 
@@ -453,10 +500,7 @@ def url_to_tree(url: str) -> Tuple[PaperNode, BeautifulSoup]:
 
 def adapt_tree_to_reader(head: Node, doc_soup: BeautifulSoup) -> None:
     """Adapt the tree for reader display."""
-    for node in head.iter_subtree_with_bfs():
-        if len(node.children) > 0:
-            continue
-        
+    for node in head.iter_leaves():
         if not isinstance(node, PaperNode):
             continue
             
@@ -465,13 +509,13 @@ def adapt_tree_to_reader(head: Node, doc_soup: BeautifulSoup) -> None:
             continue
         
         # Process reference links
-        anchors = node_soup.find_all('a', href=re.compile(r'#ref-CR'))
+        anchors = node_soup.find_all('a', href=_REF_CR_PATTERN)
         
         for anchor in anchors:
-            tooltip_title = anchor.get('title', 'Reference')
-            anchor['style'] = 'color: blue;'
-            anchor.attrs.pop('href', None)
-            anchor.attrs.pop('title', None)
+            attrs = anchor.attrs
+            tooltip_title = attrs.pop('title', 'Reference')
+            attrs.pop('href', None)
+            attrs['style'] = 'color: blue;'
             
             tooltip = doc_soup.new_tag('Tooltip', title=tooltip_title)
             box = doc_soup.new_tag('Box', component='span')
@@ -484,43 +528,47 @@ def adapt_tree_to_reader(head: Node, doc_soup: BeautifulSoup) -> None:
 # Main Processing Function
 # ============================================================================
 
-def run_nature_paper_to_tree(html_source: str, url: str) -> PaperNode:
+def run_nature_paper_to_tree(html_source: Union[str, bytes], url: str) -> PaperNode:
     """Main function to convert Nature paper HTML to tree structure."""
     doc, doc_soup = html_to_tree(html_source, url)
-    complete_relative_links(doc_soup, url)
+    
+    # One walk serves the section pass, the abstract lookup and the summaries,
+    # the nodes removed on the way are dropped from it afterwards
+    nodes = list(doc.iter_subtree_with_bfs())
+    removed = set()
     
     # Process section nodes
-    for node in doc.iter_subtree_with_bfs():
+    for node in nodes:
         if not isinstance(node, PaperNode):
             continue
             
+        # Sections without children were already serialized in html_to_tree
         if "section" in node._label:
-            if len(node.children) == 0:
-                node.content = str(node._html_soup)
-            elif len(node.children) == 1:
+            if len(node.children) == 1:
                 child = node.children[0]
                 if isinstance(child, PaperNode) and child._label == "paragraph":
                     node.content = child.content
                     child.remove_self()
+                    removed.add(child)
     
     # Extract and remove abstract
     abstract_content = ""
-    for node in doc.iter_subtree_with_bfs():
-        if node.title == "Abstract":
+    for node in nodes:
+        if node.title == "Abstract" and node not in removed:
             abstract_content = node.content
             node.remove_self()
+            removed.add(node)
             break
     
     # Generate summaries
-    from reader.build_summary import generate_summary_for_node
-    node_map_with_dependency(list(doc.iter_subtree_with_bfs()), generate_summary_for_node, n_workers=20)
+    run_coroutine(anode_map_with_dependency([node for node in nodes if node not in removed],
+                                            agenerate_summary_for_node, max_concurrency=20), max_workers=20)
     
     # Adapt for reader
     adapt_tree_to_reader(doc, doc_soup)
     doc.content = abstract_content
     
     # Construct related figures
-    from reader.reference import construct_related_figures
     construct_related_figures(doc)
     
     return doc
@@ -537,7 +585,7 @@ if __name__ == "__main__":
     mllm.config.default_models.expensive = "gpt-4o"
     
     nature_url = "https://www.nature.com/articles/s41557-025-01815-x"
-    html_source = requests.get(nature_url).text
+    html_source = _SESSION.get(nature_url, timeout=REQUEST_TIMEOUT).content
     doc = run_nature_paper_to_tree(html_source, nature_url)
     
     # Uncomment to push tree to database
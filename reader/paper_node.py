@@ -0,0 +1,37 @@
+from typing import List
+
+from bs4 import BeautifulSoup
+
+from tree import Node
+
+
+class PaperNode(Node):
+    """A specialized Node class for representing paper content."""
+    __slots__ = ("_label", "_html_soup")
+
+    def __init__(self, source: BeautifulSoup, label: str, title: str = "", content: str = ""):
+        super().__init__(title, content)
+        self._label: str = label
+        self._html_soup: BeautifulSoup = source
+
+    def get_label(self) -> str:
+        """Get the node label."""
+        return self._label
+
+    def get_soup(self) -> BeautifulSoup:
+        """Get the BeautifulSoup object."""
+        return self._html_soup
+
+    def set_soup(self, soup: BeautifulSoup) -> None:
+        """Set the BeautifulSoup object."""
+        self._html_soup = soup
+
+    def finalize_content(self) -> None:
+        """Serialize the soup into the content, once all the edits to it are done."""
+        self.content = str(self._html_soup)
+
+    def set_children(self, children: List[Node]) -> None:
+        """Set children and establish parent relationships."""
+        self._children = children
+        for child in self._children:
+            child._parent = self
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from tree import Attr, Node
-from reader.nature_paper_to_tree import PaperNode
+from reader.paper_node import PaperNode
 
 
 class Reference(Attr):
@@ -12,6 +12,28 @@ if TYPE_CHECKING:
     from tree import Node
 
 high_quality_summary = False
+# Print the LLM results
+verbose = False
+
+# The instructions come before the case text so that every call shares the same prompt prefix
+paragraph_summary_prompt = """
+    Providing a paragraph of a case law, write a summary about the paragraph below.
+    Output a JSON with the following keys:
+    - "summary" (string):  a summary about 3 sentences. The summary should be a shortened version of the content of the it. 
+    - "keypoint" (string): a shorter summary for no more than 10 words which could use for a Table of Contents. 
+    Output only the JSON object, without any text before or after it.
+    <Paragraph>
+    {content}
+    </Paragraph>
+    """
+
+section_summary_prompt = """
+        Providing the summary of each paragraph of a case law in a section. Return the summary (About 3 sentences) of this section in JSON format with the tag "summary":
+    Output only the JSON object, without any text before or after it.
+    <Paragraphs>
+    {summaries}
+    </Paragraphs>
+        """
 
 
 class Summary(Attr):
@@ -91,19 +113,12 @@ class Summary(Attr):
 def generate_summary_for_node(node: Node) -> bool:
     if 'Segment' in node.title[:7]:  # Paragraph
         chat = Chat()
-        chat += f"""
-    Providing a paragraph of a case law, write a summary about the following paragraph
-    <Paragraph>
-    {node.content}
-    </Paragraph>
-    Output a JSON with the following keys:
-    - "summary" (string):  a summary about 3 sentences. The summary should be a shortened version of the content of the it. 
-    - "keypoint" (string): a shorter summary for no more than 10 words which could use for a Table of Contents. 
-    """
+        chat += paragraph_summary_prompt.format(content=node.content)
         try:
             result = chat.complete(expensive=high_quality_summary, parse="dict",
                                    cache=True)
-            print("paragraph:", result)
+            if verbose:
+                print("paragraph:", result)
             summary = result['summary']
             Summary.get(node).content = summary
             node.title = f"{node.title}: {result['keypoint']}"
@@ -114,12 +129,12 @@ def generate_summary_for_node(node: Node) -> bool:
         for e in node.children:
             if Summary not in e.attrs:
                 return False
-        chat += f"""
-        Providing the summary of each paragraph of a case law in a section. Return the summary (About 3 sentences) of this section in JSON format with the tag "summary":
-    <Paragraphs>
-    {[Summary.get(e).content for e in node.children if Summary in e.attrs and Summary.get(e).content != "No summary"]}
-    </Paragraphs>
-        """
+        summaries = []
+        for e in node.children:
+            summary = Summary.get(e).content
+            if summary != "No summary":
+                summaries.append(summary)
+        chat += section_summary_prompt.format(summaries=summaries)
         try:
             result = chat.complete(expensive=high_quality_summary, parse="dict",
                                    cache=True)
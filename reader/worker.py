@@ -1,4 +1,7 @@
+import asyncio
+import hashlib
 import os
+from collections import OrderedDict
 import dotenv
 import litellm
 import mllm
@@ -41,6 +44,53 @@ if not all([api_key, forest_host, admin_token]):
 litellm.openai_key = api_key
 
 
+# Trees generated or looked up by this process, by (collection, owner, content key)
+recent_tree_limit = 128
+recent_tree_urls: OrderedDict[tuple[str, Optional[str], str], str] = OrderedDict()
+
+
+@app.on_event("startup")
+def create_cache_indexes():
+    # Not unique, as older caches may already hold duplicates
+    db["nature_papers"].create_index("paper_url")
+    db["nature_papers"].create_index("content_key")
+    db["pdf_papers"].create_index("file_url")
+    db["pdf_papers"].create_index([("content_key", 1), ("userid", 1)])
+
+
+def content_key(html_source: str) -> str:
+    # Uploads that only differ in whitespace share the key
+    normalized = " ".join(html_source.split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def remember_tree_url(cache_collection, key: str, tree_url: str, owner: Optional[str] = None):
+    recent_key = (cache_collection.name, owner, key)
+    recent_tree_urls[recent_key] = tree_url
+    recent_tree_urls.move_to_end(recent_key)
+    if len(recent_tree_urls) > recent_tree_limit:
+        recent_tree_urls.popitem(last=False)
+
+
+def find_cached_tree_url(cache_collection, query: dict, key: str, owner: Optional[str] = None) -> Optional[str]:
+    """
+    :param owner: The user owning the trees of the collection. Trees with the same content are only shared with the same owner
+    :return: The url of the tree generated for the query or for the same content, or None
+    """
+    recent_key = (cache_collection.name, owner, key)
+    tree_url = recent_tree_urls.get(recent_key)
+    if tree_url is not None:
+        recent_tree_urls.move_to_end(recent_key)
+        return tree_url
+    cached_result = cache_collection.find_one(query, {"tree_url": 1})
+    if cached_result is None:
+        cached_result = cache_collection.find_one({"content_key": key, "userid": owner}, {"tree_url": 1})
+    if cached_result is None:
+        return None
+    remember_tree_url(cache_collection, key, cached_result["tree_url"], owner)
+    return cached_result["tree_url"]
+
+
 # Pydantic models for request validation
 class NatureRequest(BaseModel):
     paper_url: str
@@ -70,27 +120,31 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.post("/generate_from_nature", response_model=TreeResponse)
 async def generate_from_nature(request: NatureRequest):
     cache_collection = db["nature_papers"]
-    cached_result = cache_collection.find_one({"paper_url": request.paper_url})
+    key = content_key(request.html_source)
+    cached_tree_url = find_cached_tree_url(cache_collection, {"paper_url": request.paper_url}, key)
 
-    if cached_result:
+    if cached_tree_url:
         return TreeResponse(
             status="success",
-            tree_url=cached_result["tree_url"],
+            tree_url=cached_tree_url,
             cached=True
         )
 
     # Generate new tree
-    doc = run_nature_paper_to_tree(request.html_source, request.paper_url)
+    # The pipeline is blocking, running it on a thread keeps the event loop serving other requests
+    doc = await asyncio.to_thread(run_nature_paper_to_tree, request.html_source, request.paper_url)
     tree_data = doc.render_to_json()
-    tree_id = push_tree_data(tree_data, forest_host, admin_token)
+    tree_id = await asyncio.to_thread(push_tree_data, tree_data, forest_host, admin_token)
 
     # Store in cache
     cache_collection.insert_one({
         "paper_url": request.paper_url,
+        "content_key": key,
         "tree_url": f"{forest_host}/?id={tree_id}",
         "tree_id": tree_id,
         "tree_data": tree_data
     })
+    remember_tree_url(cache_collection, key, f"{forest_host}/?id={tree_id}")
 
     return TreeResponse(
         status="success",
@@ -109,14 +163,16 @@ async def generate_from_html(request: HTMLRequest):
         cache_collection = db["pdf_papers"]
         print("Connected to database successfully")
         
-        cached_result = cache_collection.find_one({"file_url": request.file_url})
-        print(f"Cache check result: {'Found' if cached_result else 'Not found'}")
+        key = content_key(request.html_source)
+        cached_tree_url = find_cached_tree_url(cache_collection, {"file_url": request.file_url}, key,
+                                               owner=request.userid)
+        print(f"Cache check result: {'Found' if cached_tree_url else 'Not found'}")
 
-        if cached_result:
+        if cached_tree_url:
             print("Returning cached result")
             return TreeResponse(
                 status="success",
-                tree_url=cached_result["tree_url"],
+                tree_url=cached_tree_url,
                 cached=True
             )
 
@@ -124,7 +180,7 @@ async def generate_from_html(request: HTMLRequest):
         
         # Generate new tree
         print("Step 1: Building HTML tree...")
-        doc = build_html_tree(request.html_source)
+        doc = await asyncio.to_thread(build_html_tree, request.html_source)
         print("Step 1: HTML tree built successfully")
         
         print("Step 2: Rendering to JSON...")
@@ -132,7 +188,8 @@ async def generate_from_html(request: HTMLRequest):
         print(f"Step 2: JSON rendered successfully, size: {len(str(tree_data))} chars")
         
         print("Step 3: Pushing tree data to forest...")
-        tree_id = push_tree_data(tree_data, forest_host, admin_token, user_id=request.userid)
+        tree_id = await asyncio.to_thread(push_tree_data, tree_data, forest_host, admin_token,
+                                          user_id=request.userid)
         tree_url = f"{forest_host}?id={tree_id}"
         print(f"Step 3: Tree pushed successfully, ID: {tree_id}")
         
@@ -141,10 +198,13 @@ async def generate_from_html(request: HTMLRequest):
         cache_collection.insert_one({
             "html_source": request.html_source,
             "file_url": request.file_url,
+            "content_key": key,
+            "userid": request.userid,
             "tree_url": tree_url,
             "tree_id": tree_id,
             "tree_data": tree_data
         })
+        remember_tree_url(cache_collection, key, tree_url, owner=request.userid)
         print("Step 4: Cache stored successfully")
 
         print(f"=== generate_from_html completed successfully ===")
@@ -169,5 +229,6 @@ if __name__ == '__main__':
         "worker:app",
         host='0.0.0.0',
         port=int(os.environ.get("PORT", 8080)),
+        workers=int(os.environ.get("WEB_CONCURRENCY", 1)),
         reload=False
     )
@@ -4,9 +4,10 @@ import json
 from typing import TYPE_CHECKING, Dict, TypedDict, Optional
 
 import requests
-
 from fastapi import HTTPException
 
+from tree.session import make_session
+
 if TYPE_CHECKING:
     from tree import Node
 
@@ -42,13 +43,15 @@ class Rendered:
         self.node_type = ""
 
     def to_json(self, node_dict):
-        if self.node.node_id in node_dict:
+        # node_dict is keyed by the string id, a node shared by several parents is serialized once
+        node_key = str(self.node.node_id)
+        if node_key in node_dict:
             return
         node_json = self.to_json_without_children()
         # Add children
         for child in self.children:
             child.to_json(node_dict)
-        node_dict[str(self.node.node_id)] = node_json
+        node_dict[node_key] = node_json
 
     def to_json_without_children(self) -> NodeJson:
         children_ids = []
@@ -94,6 +97,11 @@ class Renderer:
         return treedata
 
 
+# Not retried, as a retried push could create the tree twice
+_session = make_session(pool_maxsize=32)
+push_timeout = 60
+
+
 def push_tree_data(tree_data: TreeData, host: str = "http://0.0.0.0:29999", token: Optional[str] = None, user_id: Optional[str] = None) -> str:
     root_id = tree_data["metadata"]["rootId"]
     payload_dict = {
@@ -111,7 +119,7 @@ def push_tree_data(tree_data: TreeData, host: str = "http://0.0.0.0:29999", toke
     if token is not None:
         headers['Authorization'] = f'Bearer {token}'
 
-    response = requests.request("PUT", f'{host}/api/createTree', headers=headers, data=payload)
+    response = _session.put(f'{host}/api/createTree', headers=headers, data=payload, timeout=push_timeout)
     try:
         response.raise_for_status()
         response_data = response.json()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import List, Callable
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Callable, Awaitable
 
 from mllm.utils import parallel_map
 
@@ -28,6 +30,53 @@ def node_map_with_dependency(nodes_to_map: List[Node], mapping_func: Callable[[N
             nodes_to_map.pop(i)
 
 
+async def anode_map_with_dependency(nodes_to_map: List[Node], mapping_func: Callable[[Node], Awaitable[bool]],
+                                    max_concurrency=8) -> None:
+    """
+    The async version of node_map_with_dependency.
+    Each round maps all the remaining nodes concurrently, with at most max_concurrency running at once.
+    """
+    if not isinstance(nodes_to_map, list):
+        nodes_to_map = list(nodes_to_map)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def map_node(node):
+        async with semaphore:
+            return await mapping_func(node)
+
+    while len(nodes_to_map) > 0:
+        finished = await asyncio.gather(*[map_node(node) for node in nodes_to_map])
+        remaining = [node for node, node_finished in zip(nodes_to_map, finished) if not node_finished]
+        if len(remaining) == len(nodes_to_map):
+            print("some node is not mapped")
+            break
+        nodes_to_map = remaining
+
+
+def run_coroutine(coro, max_workers: int | None = None):
+    """
+    Run a coroutine to completion from synchronous code, on a new event loop.
+    :param max_workers: The number of threads for asyncio.to_thread in the coroutine.
+    The default executor of asyncio only has min(32, cpu + 4) threads, which caps the concurrent LLM calls on small machines.
+    When called inside a running event loop, the coroutine runs on a separate thread, but the caller still waits for it
+    and blocks that loop. Async code should await the coroutine instead.
+    """
+    if max_workers is not None:
+        coro = _with_default_executor(coro, max_workers)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+async def _with_default_executor(coro, max_workers: int):
+    # asyncio.run shuts the default executor down when the loop closes
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_workers))
+    return await coro
+
+
 class NodeMap:
     def __init__(self, content_map=None, title_map=None):
         self._content_map: Callable[
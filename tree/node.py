@@ -14,6 +14,8 @@ class Node:
     The class for node on the Tree class. It only stores the content of the node.
     The relation between nodes are stored in the Tree class instance (self.tree).
     """
+    # Large documents have thousands of nodes, so no per-instance __dict__
+    __slots__ = ("content", "title", "attrs", "node_id", "children", "parents", "dirty")
 
     def __init__(self, title="", content=""):
         super().__init__()
@@ -283,6 +285,24 @@ class Node:
                     visited.add(child)
                     stack.append(child)
 
+    def iter_leaves(self):
+        """
+        Iterate the nodes without children in the subtree, without yielding the nodes above them.
+        Output the leaves from left to right.
+        :return: An iterator of nodes
+        """
+        stack = [self]
+        visited = {self}
+        while len(stack) > 0:
+            curr_node = stack.pop()
+            if len(curr_node.children) == 0:
+                yield curr_node
+                continue
+            for child in reversed(curr_node.children):
+                if child not in visited:
+                    visited.add(child)
+                    stack.append(child)
+
     """
     ## Node attrs related functions
 
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) seconds for fetching pages
+REQUEST_TIMEOUT = (5, 30)
+
+
+def make_session(pool_maxsize: int, retries: int = 0, user_agent: Optional[str] = None) -> requests.Session:
+    """
+    Make a session that keeps connections alive, so repeated requests to a host skip the TCP+TLS handshake.
+    requests already asks for gzip and decompresses it.
+    :param pool_maxsize: The number of connections kept per host, at least the number of threads using the session
+    :param retries: The number of retries on connection errors, with a short exponential backoff
+    """
+    session = requests.Session()
+    if user_agent is not None:
+        session.headers['User-Agent'] = user_agent
+    adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize,
+                          max_retries=Retry(total=retries, backoff_factor=0.3) if retries else 0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session